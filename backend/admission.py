@@ -0,0 +1,290 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import math
+import os
+import time
+from contextlib import contextmanager
+
+from telemetry import count_admission, set_queue_depth
+
+# ================== Admission Control ==================
+# Two layers keep a traffic spike from queueing unbounded CPU work:
+#
+# 1. Every analysis route has a bounded number of admitted requests. Once it
+#    is full, new requests get an immediate 503 with Retry-After instead of
+#    waiting behind work that will finish after the client has given up.
+# 2. Each model pool is fronted by a priority queue of the same width as the
+#    pool, so the pool itself never queues. Waiting calls are served by
+#    priority class (interactive before standard before bulk), and calls whose
+#    request deadline has passed are dropped instead of run.
+#
+# A request's priority and deadline travel with it in a context variable, set
+# when it is admitted; micro-batchers carry them per queued item.
+#
+#   ADMISSION_QUEUE_LIMIT            admitted requests per route (queued + running)
+#   ADMISSION_QUEUE_LIMIT_<ROUTE>    per-route override, e.g. ADMISSION_QUEUE_LIMIT_SUMMARIZE=16
+#   MODEL_QUEUE_LIMIT                calls waiting for one model pool
+#   REQUEST_DEADLINE_<CLASS>         seconds a request may take, per priority
+#                                    class (INTERACTIVE, STANDARD, BULK); 0 = none
+#   REQUEST_DEADLINE_<ROUTE>         per-route override
+#
+# Clients can ask for a shorter deadline with an "X-Request-Timeout: <seconds>" header.
+
+INTERACTIVE, STANDARD, BULK = 0, 1, 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", STANDARD: "standard", BULK: "bulk"}
+
+ADMISSION_QUEUE_LIMIT = int(os.getenv('ADMISSION_QUEUE_LIMIT', 32))
+MODEL_QUEUE_LIMIT = int(os.getenv('MODEL_QUEUE_LIMIT', 64))
+REQUEST_DEADLINES = {
+    INTERACTIVE: float(os.getenv('REQUEST_DEADLINE_INTERACTIVE', 20)),
+    STANDARD: float(os.getenv('REQUEST_DEADLINE_STANDARD', 60)),
+    BULK: float(os.getenv('REQUEST_DEADLINE_BULK', 0)),
+}
+RETRY_AFTER_MAX = 60
+
+# path -> (route name, priority class)
+ROUTE_POLICIES = {
+    "/sentiment": ("sentiment", INTERACTIVE),
+    "/bias": ("bias", INTERACTIVE),
+    "/question": ("question", INTERACTIVE),
+    "/question/stream": ("question_stream", INTERACTIVE),
+    "/gpt-answer": ("gpt_answer", INTERACTIVE),
+    "/gpt-answer/stream": ("gpt_answer_stream", INTERACTIVE),
+    "/detect-image": ("detect_image", INTERACTIVE),
+    "/fetch-news": ("fetch_news", INTERACTIVE),
+    "/summarize": ("summarize", STANDARD),
+    "/summarize/stream": ("summarize_stream", STANDARD),
+    "/common-questions": ("common_questions", STANDARD),
+    "/analyze": ("analyze", STANDARD),
+    "/analyze/batch": ("analyze_batch", BULK),
+}
+
+
+class AdmissionError(Exception):
+    status_code = 503
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Overloaded(AdmissionError):
+    pass
+
+
+class DeadlineExceeded(AdmissionError):
+    pass
+
+
+class Ticket:
+    def __init__(self, priority=STANDARD, deadline=None):
+        self.priority = priority
+        # time.monotonic() instant, or None for no deadline
+        self.deadline = deadline
+
+    def expired(self) -> bool:
+        return self.deadline is not None and self.deadline <= time.monotonic()
+
+
+_ticket = contextvars.ContextVar("admission_ticket", default=None)
+
+
+def current_ticket() -> Ticket:
+    return _ticket.get() or Ticket()
+
+
+def request_deadline():
+    return current_ticket().deadline
+
+
+@contextmanager
+def ticket(priority=STANDARD, deadline=None):
+    token = _ticket.set(Ticket(priority, deadline))
+    try:
+        yield
+    finally:
+        _ticket.reset(token)
+
+
+def deadline_for(route, priority, requested=None):
+    seconds = float(os.getenv(f'REQUEST_DEADLINE_{route.upper()}', REQUEST_DEADLINES[priority]))
+    if requested:
+        seconds = min(seconds, requested) if seconds else requested
+    return time.monotonic() + seconds if seconds else None
+
+
+def retry_after(seconds) -> int:
+    return max(1, min(RETRY_AFTER_MAX, math.ceil(seconds)))
+
+
+class RouteGate:
+    # Bounded count of admitted requests for one route
+    def __init__(self, name, priority, limit):
+        self.name = name
+        self.priority = priority
+        self.limit = limit
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.mean_seconds = 1.0
+
+    def enter(self):
+        if self.in_flight >= self.limit:
+            self.rejected += 1
+            count_admission(self.name, "rejected")
+            raise Overloaded(f"'{self.name}' is at capacity ({self.limit} requests)", retry_after(self.mean_seconds))
+        self.in_flight += 1
+        self.admitted += 1
+        count_admission(self.name, "admitted")
+        set_queue_depth(f"route/{self.name}", self.in_flight)
+
+    def leave(self, seconds):
+        self.in_flight -= 1
+        self.mean_seconds = 0.8 * self.mean_seconds + 0.2 * seconds
+        set_queue_depth(f"route/{self.name}", self.in_flight)
+
+    def stats(self) -> dict:
+        return {
+            "priority": PRIORITY_NAMES[self.priority],
+            "in_flight": self.in_flight,
+            "limit": self.limit,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "mean_seconds": round(self.mean_seconds, 3),
+        }
+
+
+class PriorityLimiter:
+    # A semaphore whose waiters are served by (priority, arrival); waiters
+    # past their deadline are dropped instead of being handed a slot
+    def __init__(self, name, capacity, max_waiting=MODEL_QUEUE_LIMIT):
+        self.name = name
+        self.capacity = capacity
+        self.max_waiting = max_waiting
+        self.active = 0
+        self._waiters = []
+        self._order = itertools.count()
+        self.granted = 0
+        self.rejected = 0
+        self.expired = 0
+        self.max_depth = 0
+        self.mean_seconds = 1.0
+
+    @property
+    def depth(self) -> int:
+        return sum(1 for entry in self._waiters if not entry[-1].done())
+
+    def _report(self):
+        set_queue_depth(f"model/{self.name}", self.depth)
+
+    def _count_expired(self):
+        self.expired += 1
+        count_admission(self.name, "expired")
+
+    def _expire(self, future):
+        self._count_expired()
+        future.set_exception(DeadlineExceeded(f"Request deadline passed while queued for '{self.name}'"))
+
+    async def acquire(self, priority=STANDARD, deadline=None):
+        if deadline is not None and deadline <= time.monotonic():
+            self._count_expired()
+            raise DeadlineExceeded(f"Request deadline passed before '{self.name}' could run")
+        if self.active < self.capacity and not self.depth:
+            self.active += 1
+            self.granted += 1
+            return
+
+        if len(self._waiters) >= self.max_waiting:
+            # Cancelled and expired waiters are only removed lazily
+            self._waiters = [entry for entry in self._waiters if not entry[-1].done()]
+            heapq.heapify(self._waiters)
+        if len(self._waiters) >= self.max_waiting:
+            self.rejected += 1
+            count_admission(self.name, "rejected")
+            wait = self.mean_seconds * len(self._waiters) / self.capacity
+            raise Overloaded(f"'{self.name}' queue is full ({self.max_waiting} waiting)", retry_after(wait))
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), deadline, future))
+        self.max_depth = max(self.max_depth, len(self._waiters))
+        self._report()
+        timeout = None if deadline is None else deadline - time.monotonic()
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self._return_unused(future)
+            self._count_expired()
+            raise DeadlineExceeded(f"Request deadline passed while queued for '{self.name}'")
+        except asyncio.CancelledError:
+            self._return_unused(future)
+            raise
+        finally:
+            self._report()
+        self.granted += 1
+
+    def _return_unused(self, future):
+        # Handed a slot just as the caller timed out or went away: pass it on
+        if future.done() and not future.cancelled() and future.exception() is None:
+            self.release()
+
+    def release(self, seconds=None):
+        if seconds is not None:
+            self.mean_seconds = 0.8 * self.mean_seconds + 0.2 * seconds
+        now = time.monotonic()
+        while self._waiters:
+            _, _, deadline, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            if deadline is not None and deadline <= now:
+                self._expire(future)
+                continue
+            # The slot passes straight to the waiter; active stays the same
+            future.set_result(None)
+            self._report()
+            return
+        self.active -= 1
+        self._report()
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "capacity": self.capacity,
+            "queue_depth": self.depth,
+            "max_queue_depth": self.max_depth,
+            "queue_limit": self.max_waiting,
+            "granted": self.granted,
+            "rejected": self.rejected,
+            "expired": self.expired,
+            "mean_seconds": round(self.mean_seconds, 3),
+        }
+
+
+class AdmissionController:
+    def __init__(self, policies=ROUTE_POLICIES):
+        self.policies = policies
+        self.gates = {
+            route: RouteGate(route, priority, int(os.getenv(f'ADMISSION_QUEUE_LIMIT_{route.upper()}', ADMISSION_QUEUE_LIMIT)))
+            for route, priority in policies.values()
+        }
+        self.limiters = {}
+
+    def gate(self, path):
+        policy = self.policies.get(path)
+        return self.gates[policy[0]] if policy else None
+
+    def limiter(self, model, capacity) -> PriorityLimiter:
+        limiter = self.limiters.get(model)
+        if limiter is None:
+            limiter = self.limiters[model] = PriorityLimiter(model, capacity)
+        return limiter
+
+    def stats(self) -> dict:
+        return {
+            "routes": {name: gate.stats() for name, gate in self.gates.items()},
+            "models": {name: limiter.stats() for name, limiter in self.limiters.items()},
+        }
+
+
+admission = AdmissionController()
@@ -0,0 +1,171 @@
+import asyncio
+import functools
+import os
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from passage_index import PassageIndex
+from telemetry import SharedTask, count_cache
+
+# ================== Article Store ==================
+# One parsed copy of each article, shared by every endpoint. The frontend hits
+# six endpoints for the same page, so without this the page gets downloaded
+# and parsed six times.
+
+ARTICLE_CACHE_TTL = float(os.getenv('ARTICLE_CACHE_TTL', 900))  # seconds
+ARTICLE_CACHE_MAX_ENTRIES = int(os.getenv('ARTICLE_CACHE_MAX_ENTRIES', 256))
+ARTICLE_CACHE_MAX_BYTES = int(os.getenv('ARTICLE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+# Query parameters that never change the page content
+# Dropped from cache keys: campaign prefixes by prefix, everything else only by exact name
+TRACKING_PREFIXES = ('utm_',)
+TRACKING_PARAMS = {'fbclid', 'gclid', 'mc_cid', 'mc_eid', 'ref', 'cmpid', 'ocid'}
+
+
+def is_tracking_param(key: str) -> bool:
+    key = key.lower()
+    return key in TRACKING_PARAMS or key.startswith(TRACKING_PREFIXES)
+
+
+def normalize_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    scheme = (parts.scheme or 'http').lower()
+    netloc = parts.netloc.lower()
+    if (scheme == 'http' and netloc.endswith(':80')) or (scheme == 'https' and netloc.endswith(':443')):
+        netloc = netloc.rsplit(':', 1)[0]
+    path = parts.path or '/'
+    if len(path) > 1 and path.endswith('/'):
+        path = path.rstrip('/')
+    query = [
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not is_tracking_param(key)
+    ]
+    return urlunsplit((scheme, netloc, path, urlencode(sorted(query)), ''))
+
+
+@dataclass
+class ParsedArticle:
+    url: str
+    title: str
+    text: str
+    cleaned_text: str
+    images: list = field(default_factory=list)
+    top_image: str = ''
+    _passage_index: PassageIndex = field(default=None, repr=False, compare=False)
+    # Set by the store holding this article, to recount its size when it grows
+    _on_resize: Callable = field(default=None, repr=False, compare=False)
+
+    def passage_index(self) -> PassageIndex:
+        # Built on first question and kept for as long as the article is cached
+        if self._passage_index is None:
+            self._passage_index = PassageIndex.from_text(self.text)
+            if self._on_resize is not None:
+                self._on_resize()
+        return self._passage_index
+
+    def size_bytes(self) -> int:
+        size = sys.getsizeof(self.title) + sys.getsizeof(self.text) + sys.getsizeof(self.cleaned_text)
+        if self._passage_index is not None:
+            size += self._passage_index.size_bytes()
+        return size + sum(sys.getsizeof(image) for image in self.images)
+
+
+@dataclass
+class _Entry:
+    article: ParsedArticle
+    size: int
+    expires_at: float
+
+
+class ArticleStore:
+    def __init__(self, fetch, ttl=ARTICLE_CACHE_TTL, max_entries=ARTICLE_CACHE_MAX_ENTRIES,
+                 max_bytes=ARTICLE_CACHE_MAX_BYTES):
+        # fetch is an async callable: url -> ParsedArticle
+        self._fetch = fetch
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get(self, url: str) -> ParsedArticle:
+        key = normalize_url(url)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                count_cache("articles", "hits")
+                return entry.article
+            self._evict(key)
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            count_cache("articles", "coalesced")
+        else:
+            self.misses += 1
+            count_cache("articles", "misses")
+            task = SharedTask(self._load(key, url))
+            self._inflight[key] = task
+        return await task.wait()
+
+    async def _load(self, key, url):
+        try:
+            article = await self._fetch(url)
+            self._put(key, article)
+            return article
+        finally:
+            self._inflight.pop(key, None)
+
+    def _put(self, key, article):
+        size = article.size_bytes()
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._evict(key)
+        self._entries[key] = _Entry(article, size, time.monotonic() + self.ttl)
+        self._bytes += size
+        # The passage index is built later, possibly on a worker thread
+        article._on_resize = functools.partial(asyncio.get_running_loop().call_soon_threadsafe, self._resize, key, article)
+        self._enforce_limits()
+
+    def _resize(self, key, article):
+        entry = self._entries.get(key)
+        if entry is None or entry.article is not article:
+            return
+        size = article.size_bytes()
+        self._bytes += size - entry.size
+        entry.size = size
+        self._enforce_limits()
+
+    def _enforce_limits(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            self._evict(next(iter(self._entries)))
+
+    def _evict(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def invalidate(self, url: str):
+        key = normalize_url(url)
+        if key in self._entries:
+            self._evict(key)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,160 @@
+import asyncio
+import os
+import time
+from collections import Counter
+
+from admission import DeadlineExceeded, current_ticket, ticket
+from executors import inference_workers, run_inference, stage_name
+from telemetry import background_task, count_admission, observe_batch, stage
+
+# ================== Micro-Batching ==================
+# Collects single-item requests from concurrent callers for a few milliseconds
+# (or until the batch is full), runs one padded forward pass on the model's
+# inference pool and hands every caller back its own result. Up to one batch
+# per pool worker (INFERENCE_WORKERS_<MODEL>) runs at a time. Callers whose
+# request deadline passed while queued are dropped from the batch, and the
+# batch waits for the model with its most urgent caller's priority.
+
+BATCH_MAX_SIZE = int(os.getenv('BATCH_MAX_SIZE', 16))
+BATCH_MAX_WAIT_MS = float(os.getenv('BATCH_MAX_WAIT_MS', 5))
+
+
+class MicroBatcher:
+    def __init__(self, name, batch_fn, pool=None, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS):
+        # batch_fn: list of items -> list of results, same order, runs in the model's pool
+        self.name = name
+        self.batch_fn = batch_fn
+        self.pool = pool or name
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = None
+        self._worker = None
+        self._held = None
+        self._slots = None
+        self._running = set()
+        self.batches = 0
+        self.items = 0
+        self.batch_sizes = Counter()
+        self.max_queue_depth = 0
+        self.expired = 0
+
+    def _ensure_worker(self):
+        # Bound to whichever loop first submits, so nothing is created at import time
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._held = None
+            self._slots = asyncio.Semaphore(inference_workers(self.pool))
+            self._worker = background_task(self._run())
+
+    async def submit(self, item):
+        return (await self.submit_many([item]))[0]
+
+    async def submit_many(self, items):
+        # One caller's items are queued as a group and never split across
+        # batches, so e.g. all windows of an article share one forward pass
+        if not items:
+            return []
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((list(items), future, current_ticket()))
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        # The forward pass is timed by the worker; this is the caller's own
+        # wait, queueing included, for its request breakdown
+        with stage(stage_name(self.pool), self.pool, observe=False):
+            return await future
+
+    async def _next_group(self, timeout=None):
+        if self._held is not None:
+            group, self._held = self._held, None
+            return group
+        if timeout is None:
+            return await self._queue.get()
+        if not self._queue.empty():
+            return self._queue.get_nowait()
+        return await asyncio.wait_for(self._queue.get(), timeout)
+
+    async def _next_batch(self):
+        batch = [await self._next_group()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            # Drain whatever is already waiting before sleeping on the deadline
+            try:
+                group = await self._next_group(max(0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                break
+            if size + len(group[0]) > self.max_batch_size:
+                # Doesn't fit: it starts the next batch instead
+                self._held = group
+                break
+            batch.append(group)
+            size += len(group[0])
+        return batch
+
+    async def _run(self):
+        # Up to one batch per pool worker in flight; the next batch keeps
+        # filling while they run
+        while True:
+            await self._slots.acquire()
+            try:
+                batch = await self._next_batch()
+            except BaseException:
+                self._slots.release()
+                raise
+            task = asyncio.ensure_future(self._run_batch(batch))
+            self._running.add(task)
+            task.add_done_callback(self._batch_done)
+
+    def _batch_done(self, task):
+        self._running.discard(task)
+        self._slots.release()
+
+    async def _run_batch(self, batch):
+        # Callers that gave up, or whose deadline passed, don't need a forward pass
+        live = []
+        for items, future, caller in batch:
+            if future.done():
+                continue
+            if caller.expired():
+                self.expired += 1
+                count_admission(self.name, "expired")
+                future.set_exception(DeadlineExceeded(f"Request deadline passed while queued for '{self.name}'"))
+                continue
+            live.append((items, future, caller))
+        batch = live
+        if not batch:
+            return
+
+        flat_items = [item for items, _, _ in batch for item in items]
+        self.batches += 1
+        self.items += len(flat_items)
+        self.batch_sizes[len(flat_items)] += 1
+        observe_batch(self.name, len(flat_items))
+        deadlines = [caller.deadline for _, _, caller in batch]
+        priority = min(caller.priority for _, _, caller in batch)
+        deadline = None if None in deadlines else max(deadlines)
+        try:
+            with ticket(priority, deadline):
+                results = await run_inference(self.pool, self.batch_fn, flat_items)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        offset = 0
+        for items, future, _ in batch:
+            if not future.done():
+                future.set_result(results[offset:offset + len(items)])
+            offset += len(items)
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": (self._queue.qsize() if self._queue is not None else 0) + (self._held is not None),
+            "batches_in_flight": len(self._running),
+            "max_queue_depth": self.max_queue_depth,
+            "expired": self.expired,
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0,
+            "batch_sizes": dict(sorted(self.batch_sizes.items())),
+        }
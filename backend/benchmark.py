@@ -0,0 +1,346 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+from stub_server import fixture_slugs
+
+# ================== Offline Benchmark ==================
+# Starts the stub server (fixture articles, NewsAPI, OpenAI) and the app in
+# subprocesses wired to it, drives every endpoint at a fixed concurrency and
+# writes throughput, p50/p95/p99 latency, error counts and peak RSS per
+# endpoint as JSON:
+#
+#   python benchmark.py run --tiny-models --concurrency 8 --requests 40 --output bench.json
+#   python benchmark.py compare baseline.json bench.json --threshold 0.10
+#
+# --tiny-models loads randomly initialized two-layer versions of every
+# checkpoint (INFERENCE_BACKEND=tiny), so a run needs only config and
+# tokenizer files, not model weights. --no-cache turns off the article,
+# result, image and LLM caches so every request does the full work.
+# --server-url benchmarks an already running app instead (pass --server-pid
+# to still get its RSS).
+
+QUESTIONS = [
+    "What is the article about?",
+    "Who is affected?",
+    "How much money is involved?",
+    "What happens next?",
+]
+
+# name -> (method, path, body builder, query params builder)
+ENDPOINTS = {
+    "summarize": ("POST", "/summarize", lambda url, i: {"url": url}, None),
+    "summarize_stream": ("POST", "/summarize/stream", lambda url, i: {"url": url}, None),
+    "sentiment": ("POST", "/sentiment", lambda url, i: {"url": url}, None),
+    "bias": ("POST", "/bias", lambda url, i: {"url": url}, None),
+    "question": ("POST", "/question", lambda url, i: {"url": url, "question": QUESTIONS[i % len(QUESTIONS)]}, None),
+    "question_stream": ("POST", "/question/stream", lambda url, i: {"url": url, "question": QUESTIONS[i % len(QUESTIONS)]}, None),
+    "common_questions": ("POST", "/common-questions", lambda url, i: {"url": url}, None),
+    "gpt_answer": ("POST", "/gpt-answer", lambda url, i: {"url": url}, lambda i: {"question": QUESTIONS[i % len(QUESTIONS)]}),
+    "gpt_answer_stream": ("POST", "/gpt-answer/stream", lambda url, i: {"url": url}, lambda i: {"question": QUESTIONS[i % len(QUESTIONS)]}),
+    "detect_image": ("POST", "/detect-image", lambda url, i: {"url": url}, None),
+    "fetch_news": ("POST", "/fetch-news", lambda url, i: {"url": url}, None),
+    "analyze": ("POST", "/analyze", lambda url, i: {"url": url}, None),
+    "analyze_batch": ("POST", "/analyze/batch", None, None),
+    "metrics": ("GET", "/metrics", None, None),
+}
+
+NO_CACHE_ENV = {
+    "ARTICLE_CACHE_MAX_ENTRIES": "0",
+    "RESULT_CACHE_MAX_ENTRIES": "0",
+    "RESULT_CACHE_PATH": "",
+    "IMAGE_HASH_MAX_ENTRIES": "0",
+    "IMAGE_HASH_CACHE_PATH": "",
+    "LLM_CACHE_MAX_ENTRIES": "0",
+}
+
+
+PERCENTILE_METHOD = "nearest-rank"
+
+
+def percentile(sorted_values, fraction):
+    # Nearest rank: the smallest value with at least fraction of values at or below it
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def rss_mb(pid):
+    # Resident memory of the process and its children, from /proc
+    total = 0
+    pids = [pid]
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            pids += [int(child) for child in f.read().split()]
+    except OSError:
+        pass
+    for p in pids:
+        try:
+            with open(f'/proc/{p}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+        except OSError:
+            pass
+    return total / 1024
+
+
+async def sample_rss(pid, peak, interval=0.05):
+    while True:
+        peak[0] = max(peak[0], rss_mb(pid))
+        await asyncio.sleep(interval)
+
+
+async def wait_until_ready(client, base_url, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get(f"{base_url}/models")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError(f"App at {base_url} not ready after {timeout}s")
+
+
+async def one_request(client, base_url, name, i, article_urls):
+    method, path, body, params = ENDPOINTS[name]
+    url = article_urls[i % len(article_urls)]
+    if name == "analyze_batch":
+        payload = {"urls": article_urls}
+    else:
+        payload = body(url, i) if body else None
+    started = time.perf_counter()
+    first_byte = None
+    # Streamed so SSE/NDJSON endpoints are timed to their last byte
+    async with client.stream(method, f"{base_url}{path}", json=payload, params=params(i) if params else None) as response:
+        async for _ in response.aiter_bytes():
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+    return response.status_code, time.perf_counter() - started, first_byte
+
+
+async def bench_endpoint(client, base_url, name, args, article_urls, pid):
+    for i in range(args.warmup):
+        await one_request(client, base_url, name, i, article_urls)
+
+    latencies, first_bytes, errors = [], [], 0
+    statuses = {}
+    counter = iter(range(args.requests))
+    peak = [rss_mb(pid) if pid else 0]
+    sampler = asyncio.ensure_future(sample_rss(pid, peak)) if pid else None
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            try:
+                status, elapsed, first_byte = await one_request(client, base_url, name, i, article_urls)
+            except httpx.HTTPError as e:
+                errors += 1
+                statuses[type(e).__name__] = statuses.get(type(e).__name__, 0) + 1
+                continue
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            if status >= 400:
+                errors += 1
+                continue
+            latencies.append(elapsed)
+            if first_byte is not None:
+                first_bytes.append(first_byte)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    wall = time.perf_counter() - started
+    if sampler:
+        sampler.cancel()
+
+    latencies.sort()
+    first_bytes.sort()
+    ms = lambda v: round(v * 1000, 1) if v is not None else None
+    return {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "ok": len(latencies),
+        "errors": errors,
+        "statuses": statuses,
+        "throughput_rps": round(len(latencies) / wall, 3) if wall else None,
+        "latency_ms": {
+            "mean": ms(sum(latencies) / len(latencies)) if latencies else None,
+            "p50": ms(percentile(latencies, 0.50)),
+            "p95": ms(percentile(latencies, 0.95)),
+            "p99": ms(percentile(latencies, 0.99)),
+            "max": ms(latencies[-1]) if latencies else None,
+        },
+        "first_byte_p50_ms": ms(percentile(first_bytes, 0.50)),
+        "peak_rss_mb": round(peak[0], 1) if pid else None,
+    }
+
+
+def start_process(cmd, env):
+    return subprocess.Popen(cmd, cwd=os.path.dirname(os.path.abspath(__file__)), env=env)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args):
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    processes = []
+    env = dict(os.environ)
+    try:
+        processes.append(start_process([sys.executable, "stub_server.py", "--port", str(args.stub_port)], env))
+
+        if args.server_url:
+            base_url, pid = args.server_url.rstrip('/'), args.server_pid
+        else:
+            app_env = dict(env, **{
+                "NEWSAPI_BASE_URL": stub_url,
+                "NEWS_API_KEY": "stub",
+                "OPENAI_API_BASE": f"{stub_url}/v1",
+                "OPENAI_API_KEY": "stub",
+                "LLM_BACKEND": "openai",
+                "LOG_LEVEL": "WARNING",
+                "PRELOAD_MODELS": "all",
+                "RESULT_CACHE_PATH": "",
+                "IMAGE_HASH_CACHE_PATH": "",
+            })
+            if args.tiny_models:
+                app_env["INFERENCE_BACKEND"] = "tiny"
+            if args.no_cache:
+                app_env.update(NO_CACHE_ENV)
+            app = start_process(
+                [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.app_port), "--log-level", "warning"],
+                app_env,
+            )
+            processes.append(app)
+            base_url, pid = f"http://127.0.0.1:{args.app_port}", app.pid
+
+        article_urls = [f"{stub_url}/articles/{slug}" for slug in fixture_slugs()]
+        results = {}
+        timeout = httpx.Timeout(args.timeout, connect=10)
+        limits = httpx.Limits(max_connections=args.concurrency * 2)
+        async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+            await wait_until_ready(client, base_url, args.startup_timeout)
+            for name in args.endpoints:
+                print(f"Benchmarking {name} ({args.requests} requests, concurrency {args.concurrency})", file=sys.stderr)
+                results[name] = await bench_endpoint(client, base_url, name, args, article_urls, pid)
+
+        return {
+            "meta": {
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "git_revision": git_revision(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "tiny_models": args.tiny_models,
+                "no_cache": args.no_cache,
+                "concurrency": args.concurrency,
+                "requests": args.requests,
+                "warmup": args.warmup,
+                "fixtures": len(article_urls),
+                "percentile": PERCENTILE_METHOD,
+            },
+            "results": results,
+        }
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline_report = json.load(f)
+    with open(args.candidate) as f:
+        candidate_report = json.load(f)
+    for path, report in ((args.baseline, baseline_report), (args.candidate, candidate_report)):
+        # Older files rounded p95/p99 up to the next rank; their tails aren't comparable
+        if report["meta"].get("percentile") != PERCENTILE_METHOD:
+            print(f"warning: {path} was not computed with {PERCENTILE_METHOD} percentiles; rerun it", file=sys.stderr)
+    baseline, candidate = baseline_report["results"], candidate_report["results"]
+
+    regressions = []
+    print(f"{'endpoint':<20} {'metric':<16} {'baseline':>10} {'candidate':>10} {'change':>8}")
+    for name in sorted(set(baseline) & set(candidate)):
+        base, new = baseline[name], candidate[name]
+        rows = [
+            ("p50_ms", base["latency_ms"]["p50"], new["latency_ms"]["p50"], False),
+            ("p95_ms", base["latency_ms"]["p95"], new["latency_ms"]["p95"], False),
+            ("p99_ms", base["latency_ms"]["p99"], new["latency_ms"]["p99"], False),
+            ("throughput_rps", base["throughput_rps"], new["throughput_rps"], True),
+            ("peak_rss_mb", base["peak_rss_mb"], new["peak_rss_mb"], False),
+        ]
+        for metric, old, value, higher_is_better in rows:
+            if not old or value is None:
+                continue
+            change = (value - old) / old
+            worse = -change if higher_is_better else change
+            flag = " !" if worse > args.threshold else ""
+            if flag:
+                regressions.append((name, metric))
+            print(f"{name:<20} {metric:<16} {old:>10} {value:>10} {change:>+7.1%}{flag}")
+        if new["errors"] > base["errors"]:
+            regressions.append((name, "errors"))
+            print(f"{name:<20} {'errors':<16} {base['errors']:>10} {new['errors']:>10}       !")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}")
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of every endpoint against fixtures and stub services.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the benchmark and write JSON results")
+    run_parser.add_argument("--endpoints", nargs="+", default=list(ENDPOINTS), choices=list(ENDPOINTS))
+    run_parser.add_argument("--concurrency", type=int, default=4)
+    run_parser.add_argument("--requests", type=int, default=20, help="Measured requests per endpoint")
+    run_parser.add_argument("--warmup", type=int, default=2, help="Unmeasured requests per endpoint")
+    run_parser.add_argument("--tiny-models", action="store_true")
+    run_parser.add_argument("--no-cache", action="store_true")
+    run_parser.add_argument("--app-port", type=int, default=8901)
+    run_parser.add_argument("--stub-port", type=int, default=8900)
+    run_parser.add_argument("--server-url", help="Benchmark an already running app instead of starting one")
+    run_parser.add_argument("--server-pid", type=int, help="PID of --server-url's process, for RSS")
+    run_parser.add_argument("--timeout", type=float, default=300, help="Per-request timeout in seconds")
+    run_parser.add_argument("--startup-timeout", type=float, default=900)
+    run_parser.add_argument("--output", help="JSON file (default: stdout)")
+
+    compare_parser = subparsers.add_parser("compare", help="Compare two result files; exit 1 on regressions")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--threshold", type=float, default=0.10, help="Allowed relative slowdown")
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        compare(args)
+        return
+
+    report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import asyncio
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from admission import admission, current_ticket
+from telemetry import stage
+
+# ================== Execution Layer ==================
+# Model inference and blocking I/O never run on the event loop. Each model gets
+# its own small bounded pool (a 10s BART beam search only queues behind other
+# BART work), and blocking network/DB calls share a separate, wider I/O pool.
+# Calls wait for a model pool in its admission queue (see admission.py), so
+# the pool's own FIFO stays empty and waiting work is served by priority.
+#
+# Pool sizes:
+#   INFERENCE_WORKERS            default concurrent calls per model (1)
+#   INFERENCE_WORKERS_<MODEL>    per-model override, e.g. INFERENCE_WORKERS_BART=2
+#   IO_WORKERS                   blocking I/O pool size (32)
+#   TORCH_NUM_THREADS            torch intra-op threads; defaults to the cores
+#                                divided by the total inference workers across
+#                                every server process (gunicorn passes its
+#                                worker count), so the pools can't oversubscribe
+#                                the CPU.
+
+# Pools that run torch ops; other pools (e.g. "tokenize") don't count toward torch threads
+MODEL_POOLS = ("bart", "flan", "sentiment", "fact_opinion", "bias", "deepfake", "manipulation")
+# Seq2seq pools are timed as "generate", the rest as "inference"
+GENERATE_POOLS = ("bart", "flan")
+
+DEFAULT_INFERENCE_WORKERS = int(os.getenv('INFERENCE_WORKERS', 1))
+IO_WORKERS = int(os.getenv('IO_WORKERS', 32))
+
+_pools = {}
+_io_pool = None
+_lock = threading.Lock()
+
+
+def inference_workers(model: str) -> int:
+    return int(os.getenv(f'INFERENCE_WORKERS_{model.upper()}', DEFAULT_INFERENCE_WORKERS))
+
+
+def torch_num_threads(processes=1) -> int:
+    # processes: server processes sharing the machine, each with its own pools
+    configured = os.getenv('TORCH_NUM_THREADS')
+    if configured:
+        return int(configured)
+    total_workers = sum(inference_workers(model) for model in MODEL_POOLS) * max(1, processes)
+    return max(1, (os.cpu_count() or 1) // total_workers)
+
+
+def configure_torch_threads(processes=1):
+    import torch
+    torch.set_num_threads(torch_num_threads(processes))
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Can only be set before any inter-op work has started
+        pass
+
+
+def inference_pool(model: str) -> ThreadPoolExecutor:
+    # Created lazily so forked workers never inherit another process's threads
+    pool = _pools.get(model)
+    if pool is None:
+        with _lock:
+            pool = _pools.get(model)
+            if pool is None:
+                pool = ThreadPoolExecutor(max_workers=inference_workers(model), thread_name_prefix=f"infer-{model}")
+                _pools[model] = pool
+    return pool
+
+
+def io_pool() -> ThreadPoolExecutor:
+    global _io_pool
+    if _io_pool is None:
+        with _lock:
+            if _io_pool is None:
+                _io_pool = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io")
+    return _io_pool
+
+
+def stage_name(model: str) -> str:
+    if model in GENERATE_POOLS:
+        return "generate"
+    return "inference" if model in MODEL_POOLS else model
+
+
+def _release_when_done(loop, limiter, started):
+    def release(_):
+        try:
+            loop.call_soon_threadsafe(limiter.release, time.perf_counter() - started)
+        except RuntimeError:
+            # Loop already closed at shutdown
+            pass
+    return release
+
+
+async def run_inference(model: str, fn, *args, **kwargs):
+    # Timed from submission, so time spent queued for the pool is included
+    loop = asyncio.get_running_loop()
+    call = functools.partial(fn, *args, **kwargs)
+    with stage(stage_name(model), model):
+        if model not in MODEL_POOLS:
+            return await loop.run_in_executor(inference_pool(model), call)
+        limiter = admission.limiter(model, inference_workers(model))
+        ticket = current_ticket()
+        await limiter.acquire(ticket.priority, ticket.deadline)
+        try:
+            future = inference_pool(model).submit(call)
+        except BaseException:
+            limiter.release()
+            raise
+        # Released when the thread finishes, not when the caller stops waiting,
+        # so a cancelled request never lets a second call onto a busy worker
+        future.add_done_callback(_release_when_done(loop, limiter, time.perf_counter()))
+        return await asyncio.wrap_future(future)
+
+
+async def run_io(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(io_pool(), functools.partial(fn, *args, **kwargs))
+
+
+def shutdown():
+    global _io_pool
+    with _lock:
+        for pool in _pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        _pools.clear()
+        if _io_pool is not None:
+            _io_pool.shutdown(wait=False, cancel_futures=True)
+            _io_pool = None
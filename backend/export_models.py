@@ -0,0 +1,151 @@
+import argparse
+import difflib
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+import numpy as np
+import torch
+from PIL import Image
+from transformers import AutoTokenizer, ViTImageProcessor
+
+from model_backends import BACKENDS, MODEL_SPECS, load_eager, load_model, onnx_path, ort_class
+
+# ================== Export & Parity Check ==================
+# Export ONNX Runtime graphs:
+#   python export_models.py export --models bart flan sentiment
+# Compare a backend against eager fp32 on the fixture set:
+#   python export_models.py parity --backend int8 --models sentiment fact_opinion
+#
+# Dynamic int8 quantization computes activation scales at runtime, so no
+# calibration data is needed; the parity check is what validates it.
+
+FIXTURE_TEXTS = os.path.join(os.path.dirname(__file__), 'fixtures', 'parity_texts.json')
+
+
+def export(names):
+    for name in names:
+        spec = MODEL_SPECS[name]
+        started = time.perf_counter()
+        # Export from a saved eager copy so models with a replaced head
+        # (manipulation) keep exactly the weights the app would load
+        with tempfile.TemporaryDirectory() as tmp:
+            load_eager(name).save_pretrained(tmp)
+            kwargs = {"use_cache": True} if spec["task"] == "seq2seq" else {}
+            ort_model = ort_class(spec["task"]).from_pretrained(tmp, export=True, **kwargs)
+            ort_model.save_pretrained(onnx_path(name))
+        print(f"Exported {name} to {onnx_path(name)} in {time.perf_counter() - started:.1f}s")
+
+
+def load_fixture_images(image_dir):
+    if image_dir:
+        paths = sorted(os.path.join(image_dir, f) for f in os.listdir(image_dir))
+        return [Image.open(path).convert("RGB") for path in paths]
+    # The photos the fixture articles embed, as the stub server renders them
+    from stub_server import FIXTURE_DIR, fixture_slugs, generate_image
+    names = set()
+    for slug in fixture_slugs():
+        with open(os.path.join(FIXTURE_DIR, f"{slug}.html"), encoding="utf-8") as f:
+            names.update(re.findall(r'/images/([\w-]+)\.jpg', f.read()))
+    return [Image.open(BytesIO(generate_image(name))).convert("RGB") for name in sorted(names)]
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def compare_seq2seq(name, reference, candidate, texts):
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_SPECS[name]["checkpoint"])
+    prefix = "summarize: " if name == "flan" else ""
+    outputs = {"reference": [], "candidate": []}
+    latency = {"reference": 0.0, "candidate": 0.0}
+    for text in texts:
+        inputs = tokenizer(prefix + text, return_tensors="pt", truncation=True, max_length=512)
+        for label, model in (("reference", reference), ("candidate", candidate)):
+            with torch.no_grad():
+                ids, seconds = timed(lambda: model.generate(**inputs, num_beams=4, max_length=60))
+            outputs[label].append(tokenizer.decode(ids[0], skip_special_tokens=True))
+            latency[label] += seconds
+    similarity = [difflib.SequenceMatcher(None, a, b).ratio() for a, b in zip(outputs["reference"], outputs["candidate"])]
+    return {
+        "exact_match": sum(a == b for a, b in zip(outputs["reference"], outputs["candidate"])) / len(texts),
+        "agreement": float(np.mean(similarity)),
+        "reference_seconds": latency["reference"],
+        "candidate_seconds": latency["candidate"],
+    }
+
+
+def compare_classifier(reference, candidate, inputs, count):
+    with torch.no_grad():
+        reference_logits, reference_seconds = timed(lambda: reference(**inputs).logits)
+        candidate_logits, candidate_seconds = timed(lambda: candidate(**inputs).logits)
+    reference_probs = torch.softmax(torch.as_tensor(reference_logits), dim=-1)
+    candidate_probs = torch.softmax(torch.as_tensor(candidate_logits), dim=-1)
+    return {
+        "agreement": (reference_probs.argmax(-1) == candidate_probs.argmax(-1)).float().mean().item(),
+        "max_prob_diff": (reference_probs - candidate_probs).abs().max().item(),
+        "reference_seconds": reference_seconds,
+        "candidate_seconds": candidate_seconds,
+        "samples": count,
+    }
+
+
+def parity(backend, names, image_dir, min_agreement):
+    with open(FIXTURE_TEXTS) as f:
+        texts = json.load(f)
+    images = load_fixture_images(image_dir)
+
+    report, failed = {}, []
+    for name in names:
+        spec = MODEL_SPECS[name]
+        reference = load_eager(name)
+        candidate = load_model(name, backend)
+
+        if spec["task"] == "seq2seq":
+            result = compare_seq2seq(name, reference, candidate, texts)
+        elif spec["task"] == "text-classification":
+            tokenizer = AutoTokenizer.from_pretrained(spec["checkpoint"])
+            inputs = tokenizer(texts, return_tensors="pt", padding=True, truncation=True, max_length=512)
+            result = compare_classifier(reference, candidate, inputs, len(texts))
+        else:
+            processor = ViTImageProcessor.from_pretrained(spec["checkpoint"])
+            inputs = processor(images=images, return_tensors="pt")
+            result = compare_classifier(reference, candidate, inputs, len(images))
+
+        result["passed"] = result["agreement"] >= min_agreement
+        if not result["passed"]:
+            failed.append(name)
+        report[name] = result
+
+    print(json.dumps({"backend": backend, "min_agreement": min_agreement, "models": report}, indent=2))
+    return not failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export optimized inference backends and check them against fp32.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Export ONNX Runtime graphs")
+    export_parser.add_argument("--models", nargs="+", default=list(MODEL_SPECS), choices=list(MODEL_SPECS))
+
+    parity_parser = subparsers.add_parser("parity", help="Compare a backend's outputs with eager fp32")
+    parity_parser.add_argument("--backend", required=True, choices=[b for b in BACKENDS if b not in ("eager", "tiny")])
+    parity_parser.add_argument("--models", nargs="+", default=list(MODEL_SPECS), choices=list(MODEL_SPECS))
+    parity_parser.add_argument("--images", help="Directory of fixture images (default: photos embedded in the fixture articles)")
+    parity_parser.add_argument("--min-agreement", type=float, default=0.9)
+
+    args = parser.parse_args()
+    if args.command == "export":
+        export(args.models)
+    elif not parity(args.backend, args.models, args.images, args.min_agreement):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
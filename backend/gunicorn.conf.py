@@ -0,0 +1,51 @@
+import gc
+import os
+import sys
+
+# ================== Shared-Weights Deployment ==================
+# Load every model once in the gunicorn master, then fork the uvicorn workers.
+# The weights live in pages the workers only read, so they stay shared
+# copy-on-write instead of being loaded again per worker. Handlers in main.py
+# are unchanged; run with:
+#
+#   gunicorn main:app -c gunicorn.conf.py
+#
+# Compare PSS (not RSS) across processes to see the saving, e.g. the
+# "process_memory" block of GET /models from each worker, or `smem -P gunicorn`.
+
+bind = os.getenv('BIND', '0.0.0.0:8000')
+workers = int(os.getenv('WEB_CONCURRENCY', 4))
+worker_class = 'uvicorn.workers.UvicornWorker'
+timeout = int(os.getenv('WORKER_TIMEOUT', 300))
+
+# Import main.py (and the model registry) in the master before forking
+preload_app = True
+
+
+def when_ready(server):
+    main = sys.modules['main']
+    from model_backends import model_backend
+
+    # ONNX Runtime sessions start their own thread pools, which don't survive a
+    # fork; those models are left to load lazily inside each worker
+    names = [name for name in main.MODEL_SPECS if model_backend(name) != 'onnx']
+    server.log.info(f"Preloading models before fork: {', '.join(names)}")
+    main.models.preload(names)
+
+    # Keep the garbage collector from writing to (and so un-sharing) the pages
+    # of every object that already exists in the master
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Each worker sizes torch's intra-op pool for its share of the cores
+    from executors import configure_torch_threads
+    configure_torch_threads(processes=server.cfg.workers)
+
+
+def child_exit(server, worker):
+    # With PROMETHEUS_MULTIPROC_DIR set, /metrics sums every worker's files;
+    # drop the live gauges of a worker that has exited
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,209 @@
+import asyncio
+import os
+import random
+import re
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+import httpx
+
+# ================== Outbound HTTP ==================
+# Every outbound fetch (articles, images, NewsAPI) goes through one pooled
+# async client: keep-alive connections reused per host, HTTP/2 when the h2
+# package is installed, connect/read timeouts plus an overall time limit (so a
+# server trickling bytes can't hold a host slot forever), a cap on response size,
+# retries with jittered exponential backoff and a concurrency limit per host,
+# so one slow publisher can't take every connection.
+#
+#   HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT   seconds
+#   HTTP_TOTAL_TIMEOUT                        seconds for a whole fetch, retries included
+#   HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE  pool sizes
+#   HTTP_PER_HOST_LIMIT                       concurrent requests per host
+#   HTTP_MAX_TRACKED_HOSTS                    per-host limiters kept; idle ones are evicted LRU
+#   HTTP_MAX_RESPONSE_BYTES                   default body cap
+#   HTTP_RETRIES                              attempts after the first
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 5))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 15))
+HTTP_TOTAL_TIMEOUT = float(os.getenv('HTTP_TOTAL_TIMEOUT', 30))
+HTTP_MAX_CONNECTIONS = int(os.getenv('HTTP_MAX_CONNECTIONS', 200))
+HTTP_MAX_KEEPALIVE = int(os.getenv('HTTP_MAX_KEEPALIVE', 50))
+HTTP_PER_HOST_LIMIT = int(os.getenv('HTTP_PER_HOST_LIMIT', 8))
+HTTP_MAX_TRACKED_HOSTS = int(os.getenv('HTTP_MAX_TRACKED_HOSTS', 1024))
+HTTP_MAX_RESPONSE_BYTES = int(os.getenv('HTTP_MAX_RESPONSE_BYTES', 5 * 1024 * 1024))
+HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', 2))
+HTTP_BACKOFF_BASE = 0.25
+HTTP_BACKOFF_MAX = 4.0
+
+USER_AGENT = "Mozilla/5.0 (compatible; Newslyzer/1.0; +https://newslyzer.biz)"
+RETRY_STATUSES = {429, 502, 503, 504}
+
+META_CHARSET = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([\w-]+)', re.I)
+BOMS = ((b'\xef\xbb\xbf', 'utf-8-sig'), (b'\xff\xfe', 'utf-16-le'), (b'\xfe\xff', 'utf-16-be'))
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class ResponseTooLarge(Exception):
+    pass
+
+
+@dataclass
+class FetchResult:
+    url: str
+    status_code: int
+    headers: httpx.Headers
+    content: bytes
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status_code < 300
+
+    def encoding(self):
+        # Content-Type charset, then a byte order mark, then <meta charset> /
+        # <meta http-equiv> in the head, as a browser would
+        match = re.search(r'charset=["\']?([\w-]+)', self.headers.get('content-type', ''), re.I)
+        if match:
+            return match.group(1)
+        for bom, encoding in BOMS:
+            if self.content.startswith(bom):
+                return encoding
+        match = META_CHARSET.search(self.content[:4096])
+        return match.group(1).decode('ascii') if match else None
+
+    @property
+    def text(self) -> str:
+        encoding = self.encoding()
+        if encoding:
+            try:
+                return self.content.decode(encoding, errors='replace')
+            except LookupError:
+                pass
+        try:
+            return self.content.decode('utf-8')
+        except UnicodeDecodeError:
+            # Undeclared and not UTF-8: almost always Latin-1 or its Windows superset
+            return self.content.decode('cp1252', errors='replace')
+
+    def json(self):
+        return httpx.Response(self.status_code, content=self.content, headers=self.headers).json()
+
+
+class HttpClient:
+    def __init__(self):
+        self._client = None
+        self._host_limits = OrderedDict()
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+
+    def client(self) -> httpx.AsyncClient:
+        # Created on first use, inside the worker process and its event loop
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                follow_redirects=True,
+                headers={"User-Agent": USER_AGENT},
+                timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE),
+            )
+        return self._client
+
+    @asynccontextmanager
+    async def _host_slot(self, url):
+        # Each host maps to [semaphore, callers holding or waiting on it]
+        host = urlsplit(url).netloc.lower()
+        entry = self._host_limits.get(host)
+        if entry is None:
+            entry = self._host_limits[host] = [asyncio.Semaphore(HTTP_PER_HOST_LIMIT), 0]
+        self._host_limits.move_to_end(host)
+        entry[1] += 1
+        self._evict_idle_hosts()
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+
+    def _evict_idle_hosts(self):
+        # Least recently used first; a host someone is using or waiting on stays
+        while len(self._host_limits) > HTTP_MAX_TRACKED_HOSTS:
+            idle = next((host for host, (_, users) in self._host_limits.items() if not users), None)
+            if idle is None:
+                break
+            del self._host_limits[idle]
+
+    async def _fetch_once(self, url, params, headers, max_bytes):
+        async with self._host_slot(url):
+            async with self.client().stream("GET", url, params=params, headers=headers) as response:
+                declared = response.headers.get('content-length')
+                if declared and declared.isdigit() and int(declared) > max_bytes:
+                    raise ResponseTooLarge(f"{url} is {declared} bytes (limit {max_bytes})")
+                content = bytearray()
+                async for chunk in response.aiter_bytes():
+                    content.extend(chunk)
+                    if len(content) > max_bytes:
+                        raise ResponseTooLarge(f"{url} exceeded {max_bytes} bytes")
+                return FetchResult(str(response.url), response.status_code, response.headers, bytes(content))
+
+    async def get(self, url, params=None, headers=None, max_bytes=HTTP_MAX_RESPONSE_BYTES, retries=HTTP_RETRIES,
+                  timeout=HTTP_TOTAL_TIMEOUT) -> FetchResult:
+        self.requests += 1
+        expires = time.monotonic() + timeout
+        attempt = 0
+        while True:
+            try:
+                result = await self._fetch_within(url, params, headers, max_bytes, expires - time.monotonic())
+            except (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError):
+                delay = self._backoff(attempt)
+                if attempt >= retries or time.monotonic() + delay >= expires:
+                    self.failures += 1
+                    raise
+            else:
+                if result.status_code not in RETRY_STATUSES or attempt >= retries:
+                    return result
+                delay = self._retry_after(result) or self._backoff(attempt)
+                if time.monotonic() + delay >= expires:
+                    # No time left for another attempt
+                    return result
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    async def _fetch_within(self, url, params, headers, max_bytes, timeout):
+        # Read timeouts only bound the gap between chunks; this bounds the whole fetch
+        try:
+            return await asyncio.wait_for(self._fetch_once(url, params, headers, max_bytes), max(timeout, 0))
+        except asyncio.TimeoutError:
+            raise httpx.ReadTimeout(f"{url} ran out of its overall fetch time") from None
+
+    @staticmethod
+    def _backoff(attempt) -> float:
+        # Full jitter: uniformly random up to the exponential cap
+        return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * 2 ** attempt))
+
+    @staticmethod
+    def _retry_after(result):
+        value = result.headers.get('retry-after', '')
+        return min(float(value), HTTP_BACKOFF_MAX) if value.isdigit() else None
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> dict:
+        return {
+            "http2": HTTP2_AVAILABLE,
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+            "hosts": len(self._host_limits),
+        }
@@ -0,0 +1,249 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from PIL import Image
+
+from executors import run_io
+from telemetry import count_cache
+
+log = logging.getLogger(__name__)
+
+# ================== Perceptual-Hash Verdict Cache ==================
+# Wire photos show up on hundreds of outlets at different URLs, sizes and
+# compression levels. Verdicts are keyed by a 64-bit dHash of the decoded
+# image and looked up within a Hamming distance, so a resized or recompressed
+# copy is a cache hit and never reaches the ViT models.
+#
+# Memory is bounded by an LRU over verdicts; the BK-tree that answers the
+# distance queries is rebuilt from the live hashes once evictions have left
+# it mostly stale. The optional SQLite tier persists verdicts across restarts
+# and is loaded back on first use; it is pruned by age and row count when
+# loaded and every IMAGE_HASH_PRUNE_EVERY writes.
+#
+#   IMAGE_HASH_MAX_DISTANCE    bits that may differ for a near-duplicate hit
+#   IMAGE_HASH_MAX_ENTRIES     in-memory verdicts
+#   IMAGE_HASH_CACHE_PATH      SQLite file; empty string disables persistence
+#   IMAGE_HASH_CACHE_TTL       seconds a disk verdict stays valid
+#   IMAGE_HASH_DISK_MAX_ENTRIES  rows kept on disk, newest first
+
+IMAGE_HASH_MAX_DISTANCE = int(os.getenv('IMAGE_HASH_MAX_DISTANCE', 4))
+IMAGE_HASH_MAX_ENTRIES = int(os.getenv('IMAGE_HASH_MAX_ENTRIES', 50000))
+IMAGE_HASH_CACHE_PATH = os.getenv('IMAGE_HASH_CACHE_PATH', 'image_hash_cache.sqlite3')
+IMAGE_HASH_CACHE_TTL = float(os.getenv('IMAGE_HASH_CACHE_TTL', 30 * 24 * 3600))
+IMAGE_HASH_DISK_MAX_ENTRIES = int(os.getenv('IMAGE_HASH_DISK_MAX_ENTRIES', 500000))
+IMAGE_HASH_PRUNE_EVERY = 1000
+
+
+def dhash(img: Image.Image, size=8) -> int:
+    # Compare each pixel with its right neighbour on a (size+1) x size grayscale thumbnail
+    small = img.convert("L").resize((size + 1, size), Image.LANCZOS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    # Nodes are [hash, {distance: child}]; a query only descends into children
+    # whose edge distance is within max_distance of the query's distance
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, value):
+        node = [value, {}]
+        if self.root is None:
+            self.root = node
+            self.size = 1
+            return
+        current = self.root
+        while True:
+            distance = hamming(value, current[0])
+            if distance == 0:
+                return
+            child = current[1].get(distance)
+            if child is None:
+                current[1][distance] = node
+                self.size += 1
+                return
+            current = child
+
+    def search(self, value, max_distance):
+        # (distance, hash) pairs within max_distance, closest first
+        if self.root is None:
+            return []
+        matches, stack = [], [self.root]
+        while stack:
+            node_value, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= max_distance:
+                matches.append((distance, node_value))
+            for edge, child in children.items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    stack.append(child)
+        return sorted(matches)
+
+
+class ImageVerdictCache:
+    def __init__(self, path=IMAGE_HASH_CACHE_PATH, max_entries=IMAGE_HASH_MAX_ENTRIES,
+                 max_distance=IMAGE_HASH_MAX_DISTANCE, ttl=IMAGE_HASH_CACHE_TTL,
+                 disk_max_entries=IMAGE_HASH_DISK_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.ttl = ttl
+        self.disk_max_entries = disk_max_entries
+        self._load_lock = asyncio.Lock()
+        self._writes_since_prune = 0
+        self._verdicts = OrderedDict()  # hash -> verdict, for the current model_id
+        self._tree = BKTree()
+        self._model_id = None
+        self._local = threading.local()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    # ---- disk tier ----
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS image_verdicts (hash TEXT NOT NULL, model_id TEXT NOT NULL, verdict TEXT NOT NULL, created_at REAL NOT NULL, PRIMARY KEY (hash, model_id))")
+            self._local.conn = conn
+        return conn
+
+    def _disk_load(self, model_id):
+        rows = self._connection().execute(
+            "SELECT hash, verdict FROM image_verdicts WHERE model_id = ? AND created_at > ? ORDER BY created_at DESC LIMIT ?",
+            (model_id, time.time() - self.ttl, self.max_entries),
+        ).fetchall()
+        return [(int(hash_hex, 16), json.loads(verdict)) for hash_hex, verdict in reversed(rows)]
+
+    def _disk_store(self, model_id, entries):
+        conn = self._connection()
+        now = time.time()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO image_verdicts (hash, model_id, verdict, created_at) VALUES (?, ?, ?, ?)",
+                [(f"{value:016x}", model_id, json.dumps(verdict), now) for value, verdict in entries],
+            )
+
+    def prune(self):
+        # Expired rows, then the oldest beyond the row cap
+        if not self.path:
+            return 0
+        conn = self._connection()
+        with conn:
+            removed = conn.execute("DELETE FROM image_verdicts WHERE created_at <= ?", (time.time() - self.ttl,)).rowcount
+            removed += conn.execute(
+                "DELETE FROM image_verdicts WHERE rowid IN (SELECT rowid FROM image_verdicts ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (self.disk_max_entries,),
+            ).rowcount
+        return removed
+
+    async def _prune(self):
+        self._writes_since_prune = 0
+        try:
+            await run_io(self.prune)
+        except sqlite3.Error as e:
+            log.warning("image hash cache prune failed", extra={"error": str(e)})
+
+    # ---- memory tier ----
+
+    async def _ensure_model(self, model_id):
+        # Verdicts from another model revision never count as hits
+        if self._model_id == model_id:
+            return
+        # Lookups arriving mid-load wait for it instead of missing on an empty tree
+        async with self._load_lock:
+            if self._model_id == model_id:
+                return
+            self._verdicts.clear()
+            self._tree = BKTree()
+            if self.path:
+                await self._prune()
+                try:
+                    for value, verdict in await run_io(self._disk_load, model_id):
+                        self._remember(value, verdict)
+                except sqlite3.Error as e:
+                    log.warning("image hash cache load failed", extra={"error": str(e)})
+            self._model_id = model_id
+
+    def _remember(self, value, verdict):
+        if value not in self._verdicts:
+            self._tree.add(value)
+        self._verdicts[value] = verdict
+        self._verdicts.move_to_end(value)
+        while len(self._verdicts) > self.max_entries:
+            self._verdicts.popitem(last=False)
+        # Evicted hashes stay in the tree as dead nodes until it is mostly stale
+        if self._tree.size > 2 * max(len(self._verdicts), 1):
+            self._tree = BKTree()
+            for live in self._verdicts:
+                self._tree.add(live)
+
+    async def lookup_many(self, hashes, model_id):
+        # One verdict (or None) per hash; the nearest live match wins
+        await self._ensure_model(model_id)
+        results = []
+        for value in hashes:
+            verdict = None
+            for distance, match in self._tree.search(value, self.max_distance):
+                if match in self._verdicts:
+                    verdict = self._verdicts[match]
+                    self._verdicts.move_to_end(match)
+                    if distance:
+                        self.near_hits += 1
+                        count_cache("image_verdicts", "near_hits")
+                    else:
+                        self.hits += 1
+                        count_cache("image_verdicts", "hits")
+                    break
+            if verdict is None:
+                self.misses += 1
+                count_cache("image_verdicts", "misses")
+            results.append(verdict)
+        return results
+
+    async def store_many(self, entries, model_id):
+        # entries: (hash, verdict) pairs
+        await self._ensure_model(model_id)
+        for value, verdict in entries:
+            self._remember(value, verdict)
+        if self.path and entries:
+            try:
+                await run_io(self._disk_store, model_id, entries)
+            except sqlite3.Error as e:
+                log.warning("image hash cache write failed", extra={"error": str(e)})
+            self._writes_since_prune += len(entries)
+            if self._writes_since_prune >= IMAGE_HASH_PRUNE_EVERY:
+                await self._prune()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.near_hits + self.misses
+        return {
+            "entries": len(self._verdicts),
+            "tree_nodes": self._tree.size,
+            "max_distance": self.max_distance,
+            "exact_hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.near_hits) / lookups, 3) if lookups else 0,
+            "disk_path": self.path or None,
+        }
@@ -0,0 +1,298 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+
+import openai
+
+from admission import DeadlineExceeded
+from telemetry import SharedTask, count_cache, stage
+
+# ================== LLM Gateway ==================
+# Every GPT call (bias analysis, common questions, Q&A fallback) goes through
+# one async gateway instead of blocking an I/O thread on
+# openai.ChatCompletion.create. The gateway limits concurrency overall and per
+# route, applies a timeout to each call, trims article text to a token
+# budget and caches responses by prompt hash, so the same prompt is only paid
+# for once.
+#
+# Backends are pluggable: "openai" talks to the API (or to any compatible
+# server set in OPENAI_API_BASE, e.g. a local stub for benchmarks) and "stub"
+# answers in-process without any network, for tests and offline runs.
+#
+#   LLM_BACKEND                  openai | stub
+#   LLM_MODEL                    chat model name
+#   LLM_CONCURRENCY              concurrent calls overall
+#   LLM_CONCURRENCY_<ROUTE>      per-route limit, e.g. LLM_CONCURRENCY_BIAS=2
+#   LLM_TIMEOUT                  seconds per call once it has a slot
+#
+# A request deadline only bounds the wait for a slot: a call that has started
+# runs to completion or LLM_TIMEOUT, whichever comes first.
+#   LLM_PROMPT_MAX_TOKENS        default budget for article text in a prompt
+#   LLM_CACHE_MAX_ENTRIES        cached responses; 0 disables the cache
+#   LLM_STUB_LATENCY_MS          simulated latency of the stub backend
+
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'openai')
+LLM_MODEL = os.getenv('LLM_MODEL', 'gpt-4')
+LLM_CONCURRENCY = int(os.getenv('LLM_CONCURRENCY', 8))
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', 60))
+LLM_PROMPT_MAX_TOKENS = int(os.getenv('LLM_PROMPT_MAX_TOKENS', 3000))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', 2048))
+LLM_STUB_LATENCY_MS = float(os.getenv('LLM_STUB_LATENCY_MS', 0))
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+class LLMError(Exception):
+    pass
+
+
+class LLMTimeout(LLMError):
+    pass
+
+
+class Tokenizer:
+    # tiktoken when installed; otherwise short word pieces and punctuation,
+    # which over-count compared to BPE and so stay inside the budget
+    def __init__(self, model):
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self._encoding = tiktoken.get_encoding("cl100k_base")
+
+    @property
+    def name(self) -> str:
+        return self._encoding.name if self._encoding is not None else "approximate"
+
+    def count(self, text: str) -> int:
+        if self._encoding is not None:
+            return len(self._encoding.encode(text))
+        return len(re.findall(r'\w{1,4}|[^\w\s]', text))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if self._encoding is not None:
+            tokens = self._encoding.encode(text)
+            return text if len(tokens) <= max_tokens else self._encoding.decode(tokens[:max_tokens])
+        pieces = list(re.finditer(r'\w{1,4}|[^\w\s]', text))
+        return text if len(pieces) <= max_tokens else text[:pieces[max_tokens].start()].rstrip()
+
+
+class OpenAIBackend:
+    def __init__(self):
+        openai.api_key = os.getenv('OPENAI_API_KEY')
+
+    async def complete(self, model, messages, timeout):
+        response = await openai.ChatCompletion.acreate(model=model, messages=messages, request_timeout=timeout)
+        return response['choices'][0]['message']['content']
+
+    async def stream(self, model, messages, timeout):
+        response = await openai.ChatCompletion.acreate(model=model, messages=messages, stream=True, request_timeout=timeout)
+        try:
+            async for chunk in response:
+                text = chunk['choices'][0].get('delta', {}).get('content')
+                if text:
+                    yield text
+        finally:
+            await response.aclose()
+
+
+class StubBackend:
+    # Deterministic answers derived from the prompt, no network
+    def __init__(self, latency_ms=LLM_STUB_LATENCY_MS):
+        self.latency = latency_ms / 1000
+
+    def _answer(self, messages):
+        prompt = messages[-1]['content']
+        digest = hashlib.sha256(prompt.encode()).hexdigest()[:8]
+        return f"Stub response {digest}: " + " ".join(prompt.split()[:24])
+
+    async def complete(self, model, messages, timeout):
+        await asyncio.sleep(self.latency)
+        return self._answer(messages)
+
+    async def stream(self, model, messages, timeout):
+        words = self._answer(messages).split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(self.latency / len(words))
+            yield word if i == 0 else " " + word
+
+
+BACKENDS = {"openai": OpenAIBackend, "stub": StubBackend}
+
+
+class LLMGateway:
+    def __init__(self, backend=LLM_BACKEND, model=LLM_MODEL, concurrency=LLM_CONCURRENCY,
+                 timeout=LLM_TIMEOUT, cache_max_entries=LLM_CACHE_MAX_ENTRIES):
+        self.backend_name = backend
+        self.backend = BACKENDS[backend]()
+        self.model = model
+        self.timeout = timeout
+        self.tokenizer = Tokenizer(model)
+        self.cache_max_entries = cache_max_entries
+        self._limit = asyncio.Semaphore(concurrency)
+        self._route_limits = {}
+        self._cache = OrderedDict()
+        self._inflight = {}
+        self.calls = 0
+        self.route_calls = {}
+        self.cache_hits = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self.failures = 0
+
+    def truncate(self, text: str, max_tokens=LLM_PROMPT_MAX_TOKENS) -> str:
+        return self.tokenizer.truncate(text, max_tokens)
+
+    def _route_limit(self, route) -> asyncio.Semaphore:
+        limit = self._route_limits.get(route)
+        if limit is None:
+            limit = self._route_limits[route] = asyncio.Semaphore(
+                int(os.getenv(f'LLM_CONCURRENCY_{route.upper()}', LLM_CONCURRENCY))
+            )
+        return limit
+
+    @staticmethod
+    def _slot_wait(route, deadline):
+        # deadline is a time.monotonic() instant; None waits for as long as it takes
+        if deadline is None:
+            return None
+        wait = deadline - time.monotonic()
+        if wait <= 0:
+            raise DeadlineExceeded(f"Request deadline passed before the LLM call for '{route}'")
+        return wait
+
+    def prompt_key(self, messages) -> str:
+        payload = json.dumps({"model": self.model, "messages": messages}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _cached(self, key):
+        text = self._cache.get(key)
+        if text is not None:
+            self._cache.move_to_end(key)
+            self.cache_hits += 1
+            count_cache("llm", "hits")
+        return text
+
+    def _remember(self, key, text):
+        if not self.cache_max_entries:
+            return
+        self._cache[key] = text
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_max_entries:
+            self._cache.popitem(last=False)
+
+    def _count_call(self, route):
+        self.calls += 1
+        self.route_calls[route] = self.route_calls.get(route, 0) + 1
+
+    async def chat(self, route, messages, deadline=None) -> str:
+        key = self.prompt_key(messages)
+        text = self._cached(key)
+        if text is not None:
+            return text
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            count_cache("llm", "coalesced")
+        else:
+            count_cache("llm", "misses")
+            self._slot_wait(route, deadline)
+            task = SharedTask(self._call(route, key, messages, deadline))
+            self._inflight[key] = task
+        return await task.wait()
+
+    async def _call(self, route, key, messages, deadline):
+        try:
+            with stage("external_api", f"llm/{route}"):
+                await self._acquire(route, deadline)
+                try:
+                    self._count_call(route)
+                    text = await asyncio.wait_for(self.backend.complete(self.model, messages, self.timeout), self.timeout)
+                finally:
+                    self._release(route)
+            self._remember(key, text)
+            return text
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise LLMTimeout(f"LLM call for '{route}' exceeded {self.timeout:.0f}s")
+        except DeadlineExceeded:
+            raise
+        except Exception:
+            self.failures += 1
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _acquire(self, route, deadline=None):
+        # Queued calls are shed with a 503 once the request deadline passes
+        try:
+            await asyncio.wait_for(self._acquire_slots(route), self._slot_wait(route, deadline))
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"Request deadline passed while waiting for an LLM slot for '{route}'")
+
+    async def _acquire_slots(self, route):
+        await self._route_limit(route).acquire()
+        try:
+            await self._limit.acquire()
+        except BaseException:
+            self._route_limit(route).release()
+            raise
+
+    def _release(self, route):
+        self._limit.release()
+        self._route_limit(route).release()
+
+    async def stream(self, route, messages, deadline=None):
+        # Text pieces as they arrive; a cached prompt is replayed as one piece
+        key = self.prompt_key(messages)
+        text = self._cached(key)
+        if text is not None:
+            yield text
+            return
+        count_cache("llm", "misses")
+        await self._acquire(route, deadline)
+        try:
+            self._count_call(route)
+            expires = time.monotonic() + self.timeout
+            parts = []
+            pieces = self.backend.stream(self.model, messages, self.timeout)
+            try:
+                while True:
+                    try:
+                        piece = await asyncio.wait_for(pieces.__anext__(), max(0, expires - time.monotonic()))
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        self.timeouts += 1
+                        raise LLMTimeout(f"LLM stream for '{route}' exceeded {self.timeout:.0f}s")
+                    parts.append(piece)
+                    yield piece
+            finally:
+                # Closes the upstream response when the client has gone away
+                await pieces.aclose()
+            self._remember(key, "".join(parts))
+        finally:
+            self._release(route)
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend_name,
+            "model": self.model,
+            "tokenizer": self.tokenizer.name,
+            "calls": self.calls,
+            "by_route": self.route_calls,
+            "cache_entries": len(self._cache),
+            "cache_hits": self.cache_hits,
+            "coalesced": self.coalesced,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "inflight": len(self._inflight),
+        }
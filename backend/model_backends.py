@@ -0,0 +1,144 @@
+import os
+
+import torch
+from transformers import (
+    AutoConfig,
+    AutoModelForSeq2SeqLM,
+    AutoModelForSequenceClassification,
+    ViTForImageClassification,
+)
+
+# ================== Inference Backends ==================
+# Every model can run as eager fp32 PyTorch, dynamically quantized int8
+# (nn.Linear weights in int8, activations quantized on the fly; no calibration
+# data needed), or an exported ONNX Runtime graph (encoder/decoder with KV
+# cache for BART and T5). Pick per model with INFERENCE_BACKEND_<MODEL>, or
+# for all models with INFERENCE_BACKEND.
+#
+# ONNX graphs are read from ONNX_MODEL_DIR/<model>; create them with
+#   python export_models.py export --models bart flan ...
+# and check them against fp32 with
+#   python export_models.py parity --backend onnx
+#
+# "tiny" builds a randomly initialized model from the checkpoint's config
+# shrunk to two narrow layers, with the real tokenizer and label set. Outputs
+# are meaningless; it exists so benchmarks and tests exercise every code path
+# without multi-GB downloads (only config and tokenizer files are fetched).
+
+BACKENDS = ("eager", "int8", "onnx", "tiny")
+
+# Applied to whichever of these attributes a model's config has
+TINY_CONFIG = {
+    "d_model": 64, "hidden_size": 64, "dim": 64,
+    "d_ff": 128, "intermediate_size": 128, "hidden_dim": 128,
+    "encoder_ffn_dim": 128, "decoder_ffn_dim": 128,
+    "num_layers": 2, "num_decoder_layers": 2, "num_hidden_layers": 2, "n_layers": 2,
+    "encoder_layers": 2, "decoder_layers": 2,
+    "num_heads": 2, "num_attention_heads": 2, "n_heads": 2,
+    "encoder_attention_heads": 2, "decoder_attention_heads": 2,
+    "d_kv": 32,
+}
+
+MODEL_SPECS = {
+    "bart": {"checkpoint": "facebook/bart-large-cnn", "task": "seq2seq"},
+    "flan": {"checkpoint": "google/flan-t5-large", "task": "seq2seq"},
+    "sentiment": {"checkpoint": "nlptown/bert-base-multilingual-uncased-sentiment", "task": "text-classification"},
+    "fact_opinion": {"checkpoint": "typeform/distilbert-base-uncased-mnli", "task": "text-classification"},
+    "deepfake": {
+        "checkpoint": "dima806/deepfake_vs_real_image_detection",
+        "task": "image-classification",
+        "kwargs": {"num_labels": 2},
+    },
+    "manipulation": {
+        "checkpoint": "google/vit-base-patch16-224",
+        "task": "image-classification",
+        # 2 classes: manipulated, not manipulated
+        "kwargs": {"num_labels": 2, "ignore_mismatched_sizes": True},
+    },
+}
+
+ONNX_MODEL_DIR = os.getenv('ONNX_MODEL_DIR', 'onnx_models')
+
+EAGER_CLASSES = {
+    "seq2seq": AutoModelForSeq2SeqLM,
+    "text-classification": AutoModelForSequenceClassification,
+    "image-classification": ViTForImageClassification,
+}
+
+
+def model_backend(name: str) -> str:
+    backend = os.getenv(f'INFERENCE_BACKEND_{name.upper()}', os.getenv('INFERENCE_BACKEND', 'eager')).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}' for {name}. Choose one of: {', '.join(BACKENDS)}")
+    return backend
+
+
+def onnx_path(name: str) -> str:
+    return os.path.join(ONNX_MODEL_DIR, name)
+
+
+def ort_class(task):
+    try:
+        from optimum.onnxruntime import (
+            ORTModelForImageClassification,
+            ORTModelForSeq2SeqLM,
+            ORTModelForSequenceClassification,
+        )
+    except ImportError as e:
+        raise ImportError("The onnx backend needs optimum[onnxruntime]: pip install 'optimum[onnxruntime]'") from e
+    return {
+        "seq2seq": ORTModelForSeq2SeqLM,
+        "text-classification": ORTModelForSequenceClassification,
+        "image-classification": ORTModelForImageClassification,
+    }[task]
+
+
+def load_eager(name: str):
+    spec = MODEL_SPECS[name]
+    kwargs = spec.get("kwargs", {})
+    # A replaced head is freshly initialized; seed it so every process (and
+    # every export) gets the same weights, without touching the global RNG
+    with torch.random.fork_rng(devices=[]):
+        if kwargs.get("ignore_mismatched_sizes"):
+            torch.manual_seed(0)
+        model = EAGER_CLASSES[spec["task"]].from_pretrained(spec["checkpoint"], **kwargs)
+    return model.eval()
+
+
+def load_tiny(name: str):
+    spec = MODEL_SPECS[name]
+    kwargs = {k: v for k, v in spec.get("kwargs", {}).items() if k != "ignore_mismatched_sizes"}
+    config = AutoConfig.from_pretrained(spec["checkpoint"], **kwargs)
+    for key, value in TINY_CONFIG.items():
+        if hasattr(config, key):
+            setattr(config, key, value)
+    model_class = EAGER_CLASSES[spec["task"]]
+    with torch.random.fork_rng(devices=[]):
+        torch.manual_seed(0)
+        model = model_class.from_config(config) if hasattr(model_class, "from_config") else model_class(config)
+    return model.eval()
+
+
+def quantize_int8(model):
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_model(name: str, backend: str = None):
+    backend = backend or model_backend(name)
+    spec = MODEL_SPECS[name]
+
+    if backend == "onnx":
+        path = onnx_path(name)
+        if not os.path.isdir(path):
+            raise FileNotFoundError(f"No ONNX export for {name} at {path}. Run: python export_models.py export --models {name}")
+        model = ort_class(spec["task"]).from_pretrained(path, **({"use_cache": True} if spec["task"] == "seq2seq" else {}))
+    elif backend == "int8":
+        model = quantize_int8(load_eager(name))
+    elif backend == "tiny":
+        model = load_tiny(name)
+    else:
+        model = load_eager(name)
+
+    # Part of the result-cache key: int8/onnx outputs aren't bit-identical to fp32
+    model.inference_backend = backend
+    return model
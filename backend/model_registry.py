@@ -0,0 +1,189 @@
+import gc
+import logging
+import os
+import threading
+import time
+
+from transformers import AutoConfig
+
+from model_backends import MODEL_SPECS, model_backend
+from telemetry import set_model_memory
+
+log = logging.getLogger(__name__)
+
+# ================== Model Registry ==================
+# Each checkpoint is loaded once and shared by every pipeline built on it
+# (the nlptown BERT backs both sentiment and DistilBERT-bias). Models load
+# lazily on first use unless listed in PRELOAD_MODELS, and the least recently
+# used ones are dropped when the loaded total goes over the memory budget.
+#
+#   PRELOAD_MODELS             comma separated names, or "all"
+#   MODEL_MEMORY_BUDGET_MB     0 = no budget
+#   MODEL_IDLE_UNLOAD_SECONDS  0 = never unload just for being idle
+
+PRELOAD_MODELS = os.getenv('PRELOAD_MODELS', '')
+MODEL_MEMORY_BUDGET_MB = float(os.getenv('MODEL_MEMORY_BUDGET_MB', 0))
+MODEL_IDLE_UNLOAD_SECONDS = float(os.getenv('MODEL_IDLE_UNLOAD_SECONDS', 0))
+
+
+def estimate_bytes(bundle) -> int:
+    # Parameters and buffers of every torch module in the bundle; ONNX Runtime
+    # sessions are approximated by the size of their graph files
+    total, seen = 0, set()
+    for value in vars(bundle).values():
+        module = getattr(value, 'model', value)
+        if id(module) in seen:
+            continue
+        seen.add(id(module))
+        if hasattr(module, 'parameters') and hasattr(module, 'buffers'):
+            total += sum(t.numel() * t.element_size() for t in module.parameters())
+            total += sum(t.numel() * t.element_size() for t in module.buffers())
+        elif hasattr(module, 'model_save_dir'):
+            directory = str(module.model_save_dir)
+            for root, _, files in os.walk(directory):
+                total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total
+
+
+def process_memory() -> dict:
+    # RSS counts copy-on-write pages shared with forked siblings in every
+    # process; PSS splits them between sharers, so summing PSS over the
+    # master and workers gives the real total
+    fields = {}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[1].isdigit():
+                    fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    except OSError:
+        return {}
+    return {
+        "rss_mb": round(fields.get('Rss', 0), 1),
+        "pss_mb": round(fields.get('Pss', 0), 1),
+        "shared_mb": round(fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0), 1),
+        "private_mb": round(fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0), 1),
+    }
+
+
+class _Entry:
+    def __init__(self, loader):
+        self.loader = loader
+        self.bundle = None
+        self.lock = threading.Lock()
+        self.loads = 0
+        self.load_seconds = None
+        self.bytes = 0
+        self.last_used = 0.0
+
+
+class ModelRegistry:
+    def __init__(self, memory_budget_mb=MODEL_MEMORY_BUDGET_MB):
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self._entries = {}
+        self._fingerprints = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, loader):
+        # loader: () -> bundle object whose attributes are the model, tokenizer, pipelines...
+        self._entries[name] = _Entry(loader)
+
+    def get(self, name):
+        entry = self._entries[name]
+        entry.last_used = time.monotonic()
+        bundle = entry.bundle
+        if bundle is not None:
+            return bundle
+        with entry.lock:
+            if entry.bundle is None:
+                started = time.perf_counter()
+                entry.bundle = entry.loader()
+                entry.load_seconds = round(time.perf_counter() - started, 2)
+                entry.bytes = estimate_bytes(entry.bundle)
+                entry.loads += 1
+                set_model_memory(name, entry.bytes)
+                log.info("model loaded", extra={"model": name, "load_seconds": entry.load_seconds, "memory_mb": round(entry.bytes / 2**20)})
+            bundle = entry.bundle
+        self._enforce_budget(keep=name)
+        return bundle
+
+    def is_loaded(self, name) -> bool:
+        return self._entries[name].bundle is not None
+
+    def preload(self, names):
+        for name in names:
+            self.get(name)
+
+    def preload_from_env(self, setting=PRELOAD_MODELS):
+        setting = setting.strip()
+        if not setting:
+            return
+        names = list(self._entries) if setting == 'all' else [n.strip() for n in setting.split(',') if n.strip()]
+        self.preload(names)
+
+    def unload(self, name):
+        entry = self._entries[name]
+        with entry.lock:
+            if entry.bundle is None:
+                return
+            # In-flight calls keep their own reference; memory goes once they finish
+            entry.bundle = None
+            entry.bytes = 0
+        set_model_memory(name, 0)
+        gc.collect()
+        log.info("model unloaded", extra={"model": name})
+
+    def _enforce_budget(self, keep):
+        if not self.memory_budget:
+            return
+        with self._lock:
+            loaded = sorted(
+                (entry.last_used, name) for name, entry in self._entries.items()
+                if entry.bundle is not None and name != keep
+            )
+            total = sum(entry.bytes for entry in self._entries.values())
+            for _, name in loaded:
+                if total <= self.memory_budget:
+                    break
+                total -= self._entries[name].bytes
+                self.unload(name)
+
+    def unload_idle(self, max_idle_seconds=MODEL_IDLE_UNLOAD_SECONDS):
+        if not max_idle_seconds:
+            return []
+        cutoff = time.monotonic() - max_idle_seconds
+        idle = [name for name, entry in self._entries.items() if entry.bundle is not None and entry.last_used < cutoff]
+        for name in idle:
+            self.unload(name)
+        return idle
+
+    def fingerprint(self, name) -> str:
+        # Checkpoint, hub revision and inference backend, without loading any
+        # weights: result-cache lookups for an unloaded model stay cheap
+        fingerprint = self._fingerprints.get(name)
+        if fingerprint is None:
+            checkpoint = MODEL_SPECS[name]["checkpoint"]
+            revision = getattr(AutoConfig.from_pretrained(checkpoint), '_commit_hash', None) or 'local'
+            fingerprint = f"{checkpoint}@{revision}:{model_backend(name)}"
+            self._fingerprints[name] = fingerprint
+        return fingerprint
+
+    def stats(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "process_memory": process_memory(),
+            "memory_budget_mb": self.memory_budget / 2**20 if self.memory_budget else None,
+            "loaded_mb": round(sum(entry.bytes for entry in self._entries.values()) / 2**20, 1),
+            "models": {
+                name: {
+                    "checkpoint": MODEL_SPECS[name]["checkpoint"],
+                    "backend": model_backend(name),
+                    "loaded": entry.bundle is not None,
+                    "loads": entry.loads,
+                    "load_seconds": entry.load_seconds,
+                    "memory_mb": round(entry.bytes / 2**20, 1),
+                    "idle_seconds": round(time.monotonic() - entry.last_used, 1) if entry.last_used else None,
+                }
+                for name, entry in self._entries.items()
+            },
+        }
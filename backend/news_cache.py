@@ -0,0 +1,108 @@
+import os
+import re
+import time
+from collections import OrderedDict
+
+from telemetry import SharedTask, count_cache
+
+# ================== NewsAPI Cache ==================
+# NewsAPI answers are the same for every caller for minutes at a time, and the
+# quota is rate limited. Entries are served fresh for `ttl` seconds, then
+# served stale while one background request refreshes them, up to
+# `stale_ttl`. Concurrent misses for the same key share one upstream call.
+#
+#   NEWS_HEADLINES_TTL          seconds headlines count as fresh
+#   NEWS_HEADLINES_COUNTRIES    countries kept warm by the refresher, comma separated
+#   NEWS_TOPIC_TTL              seconds a topic query counts as fresh
+#   NEWS_STALE_TTL              how long past its ttl an entry may still be served
+
+NEWS_HEADLINES_TTL = float(os.getenv('NEWS_HEADLINES_TTL', 300))
+NEWS_HEADLINES_COUNTRIES = [c.strip() for c in os.getenv('NEWS_HEADLINES_COUNTRIES', 'us').split(',') if c.strip()]
+NEWS_TOPIC_TTL = float(os.getenv('NEWS_TOPIC_TTL', 900))
+NEWS_STALE_TTL = float(os.getenv('NEWS_STALE_TTL', 3600))
+NEWS_CACHE_MAX_ENTRIES = int(os.getenv('NEWS_CACHE_MAX_ENTRIES', 1024))
+
+
+def normalize_query(query: str) -> str:
+    query = re.sub(r'[^\w\s]', ' ', query.lower())
+    return re.sub(r'\s+', ' ', query).strip()
+
+
+class StaleWhileRevalidateCache:
+    def __init__(self, name, ttl, stale_ttl=NEWS_STALE_TTL, max_entries=NEWS_CACHE_MAX_ENTRIES):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, fetched_at)
+        self._inflight = {}
+        self.fresh_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.upstream_calls = 0
+        self.refresh_failures = 0
+
+    async def get(self, key, fetch):
+        # fetch: async () -> value; raises on upstream failure so errors are never cached
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, fetched_at = entry
+            age = time.monotonic() - fetched_at
+            if age < self.ttl:
+                self.fresh_hits += 1
+                count_cache(self.name, "fresh_hits")
+                self._entries.move_to_end(key)
+                return value
+            if age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                count_cache(self.name, "stale_hits")
+                self._entries.move_to_end(key)
+                self._start_refresh(key, fetch)
+                return value
+
+        self.misses += 1
+        count_cache(self.name, "misses")
+        return await self._start_refresh(key, fetch).wait()
+
+    def _start_refresh(self, key, fetch):
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return task
+        task = SharedTask(self._refresh(key, fetch))
+        self._inflight[key] = task
+        # A background refresh nobody awaits must not log "exception never retrieved"
+        task.task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+
+    async def _refresh(self, key, fetch):
+        try:
+            self.upstream_calls += 1
+            try:
+                value = await fetch()
+            except Exception:
+                self.refresh_failures += 1
+                raise
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    async def refresh(self, key, fetch):
+        # Unconditional refresh, for keeping entries warm ahead of their ttl
+        return await self._start_refresh(key, fetch).wait()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "fresh_hits": self.fresh_hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "upstream_calls": self.upstream_calls,
+            "refresh_failures": self.refresh_failures,
+        }
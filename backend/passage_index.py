@@ -0,0 +1,103 @@
+import math
+import os
+import re
+import sys
+from collections import Counter
+
+# ================== Passage Retrieval ==================
+# FLAN-T5 only sees ~500 tokens, so instead of the article's first paragraph
+# it gets the passages that best match the question. Articles are split into
+# passages of roughly PASSAGE_WORDS words along paragraph and sentence
+# boundaries and ranked with BM25; the index is built once per article and
+# kept on the ParsedArticle, so repeat questions only pay for the query.
+#
+#   PASSAGE_WORDS      target passage length in words
+#   PASSAGE_TOP_K      passages considered for the prompt
+
+PASSAGE_WORDS = int(os.getenv('PASSAGE_WORDS', 80))
+PASSAGE_TOP_K = int(os.getenv('PASSAGE_TOP_K', 4))
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+STOPWORDS = frozenset("""
+a an and are as at be but by did do does for from had has have how i if in is it its
+of on or that the their them they this to was were what when where which who whom why
+will with would you your he she his her we our not no
+""".split())
+
+
+def terms(text: str) -> list:
+    return [t for t in re.findall(r'[a-z0-9]+', text.lower()) if t not in STOPWORDS]
+
+
+def split_passages(text: str, target_words=PASSAGE_WORDS) -> list:
+    # Whole paragraphs are packed together up to the target; a paragraph that
+    # is too long on its own is split between sentences
+    pieces = []
+    for paragraph in re.split(r'\n\s*\n|\n', text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph.split()) <= target_words:
+            pieces.append(paragraph)
+        else:
+            pieces.extend(s for s in re.split(r'(?<=[.!?])\s+', paragraph) if s)
+
+    passages, current, current_words = [], [], 0
+    for piece in pieces:
+        words = len(piece.split())
+        if current and current_words + words > target_words:
+            passages.append(" ".join(current))
+            current, current_words = [], 0
+        current.append(piece)
+        current_words += words
+    if current:
+        passages.append(" ".join(current))
+    return passages
+
+
+class PassageIndex:
+    def __init__(self, passages):
+        self.passages = passages
+        self._term_counts = [Counter(terms(p)) for p in passages]
+        self._lengths = [sum(counts.values()) for counts in self._term_counts]
+        self._avg_length = (sum(self._lengths) / len(passages)) if passages else 0
+        document_frequency = Counter()
+        for counts in self._term_counts:
+            document_frequency.update(counts.keys())
+        n = len(passages)
+        self._idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for term, df in document_frequency.items()
+        }
+
+    def size_bytes(self) -> int:
+        # Rough: the passage strings, per-passage term counters and the idf
+        # table; term strings are counted once, through the idf keys
+        size = sys.getsizeof(self.passages) + sum(sys.getsizeof(p) for p in self.passages)
+        size += sum(sys.getsizeof(counts) for counts in self._term_counts) + sys.getsizeof(self._lengths)
+        return size + sys.getsizeof(self._idf) + sum(sys.getsizeof(term) for term in self._idf)
+
+    @classmethod
+    def from_text(cls, text: str):
+        return cls(split_passages(text))
+
+    def score(self, query: str) -> list:
+        query_terms = set(terms(query))
+        scores = []
+        for counts, length in zip(self._term_counts, self._lengths):
+            score = 0.0
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * length / (self._avg_length or 1))
+            for term in query_terms:
+                tf = counts.get(term)
+                if tf:
+                    score += self._idf[term] * tf * (BM25_K1 + 1) / (tf + norm)
+            scores.append(score)
+        return scores
+
+    def search(self, query: str, k=PASSAGE_TOP_K) -> list:
+        # Passage positions, best match first; with no term overlap at all the
+        # article's opening passages are the best guess
+        scores = self.score(query)
+        ranked = sorted(range(len(scores)), key=lambda i: (-scores[i], i))
+        return ranked[:k]
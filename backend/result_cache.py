@@ -0,0 +1,285 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from executors import run_io
+from telemetry import SharedTask, count_cache
+
+log = logging.getLogger(__name__)
+
+# ================== Result Cache ==================
+# Model outputs keyed by a hash of the cleaned article text, the model
+# name/revision and the generation parameters. Two tiers: an in-process LRU and
+# a SQLite file (WAL mode) that survives restarts and is shared by every
+# uvicorn worker on the host. The model revision is part of the key, so
+# swapping a checkpoint never serves stale results. The disk tier is pruned
+# by age and row count on the first write after startup and every
+# RESULT_CACHE_PRUNE_EVERY writes after that.
+#
+#   RESULT_CACHE_PATH          SQLite file; empty string disables the disk tier
+#   RESULT_CACHE_MAX_ENTRIES   in-memory LRU size
+#   RESULT_CACHE_TTL           seconds a disk entry stays valid
+#   RESULT_CACHE_DISK_MAX_ENTRIES  rows kept on disk, newest first
+#   RESULT_CACHE_VERSION       bump to drop everything cached so far
+
+RESULT_CACHE_PATH = os.getenv('RESULT_CACHE_PATH', 'result_cache.sqlite3')
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv('RESULT_CACHE_MAX_ENTRIES', 2048))
+RESULT_CACHE_TTL = float(os.getenv('RESULT_CACHE_TTL', 7 * 24 * 3600))
+RESULT_CACHE_DISK_MAX_ENTRIES = int(os.getenv('RESULT_CACHE_DISK_MAX_ENTRIES', 200000))
+RESULT_CACHE_VERSION = os.getenv('RESULT_CACHE_VERSION', '1')
+RESULT_CACHE_PRUNE_EVERY = 1000
+
+
+def content_hash(data) -> str:
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, path=RESULT_CACHE_PATH, max_entries=RESULT_CACHE_MAX_ENTRIES, ttl=RESULT_CACHE_TTL,
+                 disk_max_entries=RESULT_CACHE_DISK_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_max_entries = disk_max_entries
+        # Starts due, so the first write after startup prunes
+        self._writes_since_prune = RESULT_CACHE_PRUNE_EVERY
+        self._memory = OrderedDict()
+        self._inflight = {}
+        self._local = threading.local()
+        self.stats_by_kind = {}
+
+    def make_key(self, kind, content, model_id, params=None) -> str:
+        payload = json.dumps({
+            "version": RESULT_CACHE_VERSION,
+            "kind": kind,
+            "content": content_hash(content),
+            "model": model_id,
+            "params": params or {},
+        }, sort_keys=True)
+        return content_hash(payload)
+
+    # ---- disk tier (runs on the I/O pool, one connection per thread) ----
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS results_created_at ON results (created_at)")
+            self._local.conn = conn
+        return conn
+
+    def _disk_get(self, key):
+        row = self._connection().execute(
+            "SELECT value FROM results WHERE key = ? AND created_at > ?", (key, time.time() - self.ttl)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _disk_get_many(self, keys):
+        placeholders = ",".join("?" * len(keys))
+        rows = self._connection().execute(
+            f"SELECT key, value FROM results WHERE key IN ({placeholders}) AND created_at > ?",
+            (*keys, time.time() - self.ttl),
+        ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def _disk_set_many(self, values):
+        conn = self._connection()
+        now = time.time()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO results (key, value, created_at) VALUES (?, ?, ?)",
+                             [(key, json.dumps(value), now) for key, value in values.items()])
+
+    def prune(self):
+        if not self.path:
+            return 0
+        conn = self._connection()
+        with conn:
+            removed = conn.execute("DELETE FROM results WHERE created_at <= ?", (time.time() - self.ttl,)).rowcount
+            removed += conn.execute(
+                "DELETE FROM results WHERE rowid IN (SELECT rowid FROM results ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (self.disk_max_entries,),
+            ).rowcount
+        return removed
+
+    async def _disk_write(self, values):
+        if not self.path or not values:
+            return
+        try:
+            await run_io(self._disk_set_many, values)
+        except sqlite3.Error as e:
+            log.warning("result cache write failed", extra={"error": str(e)})
+        self._writes_since_prune += len(values)
+        if self._writes_since_prune >= RESULT_CACHE_PRUNE_EVERY:
+            self._writes_since_prune = 0
+            try:
+                await run_io(self.prune)
+            except sqlite3.Error as e:
+                log.warning("result cache prune failed", extra={"error": str(e)})
+
+    # ---- memory tier ----
+
+    def _memory_set(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _count(self, kind, outcome):
+        counts = self.stats_by_kind.setdefault(kind, {"memory_hits": 0, "disk_hits": 0, "misses": 0})
+        counts[outcome] += 1
+        count_cache(f"result/{kind}", outcome)
+
+    async def get_or_compute(self, kind, content, model_id, params, compute):
+        # compute is an async callable producing a JSON-serializable result
+        key = self.make_key(kind, content, model_id, params)
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self._count(kind, "memory_hits")
+            return self._memory[key]
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = SharedTask(self._load(kind, key, compute))
+            self._inflight[key] = task
+        return await task.wait()
+
+    async def _load(self, kind, key, compute):
+        try:
+            if self.path:
+                try:
+                    value = await run_io(self._disk_get, key)
+                except sqlite3.Error as e:
+                    log.warning("result cache read failed", extra={"error": str(e)})
+                    value = None
+                if value is not None:
+                    self._count(kind, "disk_hits")
+                    self._memory_set(key, value)
+                    return value
+
+            self._count(kind, "misses")
+            value = await compute()
+            # Round-trip through JSON so memory hits look exactly like disk hits
+            value = json.loads(json.dumps(value))
+            self._memory_set(key, value)
+            await self._disk_write({key: value})
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    async def get(self, kind, content, model_id, params):
+        # Plain lookup in both tiers, None on a miss; for producers (like token
+        # streams) that can't hand get_or_compute a single awaitable
+        key = self.make_key(kind, content, model_id, params)
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self._count(kind, "memory_hits")
+            return self._memory[key]
+        if self.path:
+            try:
+                value = await run_io(self._disk_get, key)
+            except sqlite3.Error as e:
+                log.warning("result cache read failed", extra={"error": str(e)})
+                value = None
+            if value is not None:
+                self._count(kind, "disk_hits")
+                self._memory_set(key, value)
+                return value
+        self._count(kind, "misses")
+        return None
+
+    async def put(self, kind, content, model_id, params, value):
+        key = self.make_key(kind, content, model_id, params)
+        value = json.loads(json.dumps(value))
+        self._memory_set(key, value)
+        await self._disk_write({key: value})
+
+    async def get_many_or_compute(self, kind, items, model_id, compute_many):
+        # Batched variant over (content, params) pairs: compute_many gets only
+        # the pairs that missed both tiers, so cached items never take up room
+        # in a forward pass. Keys already being loaded, by this or
+        # get_or_compute, are awaited instead of computed twice.
+        keys = [self.make_key(kind, content, model_id, params) for content, params in items]
+        values = [None] * len(keys)
+        pending = {}
+        for i, key in enumerate(keys):
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._count(kind, "memory_hits")
+                values[i] = self._memory[key]
+            else:
+                pending.setdefault(key, items[i])
+
+        waiting = {key: self._inflight[key] for key in pending if key in self._inflight}
+        owned = {key: item for key, item in pending.items() if key not in waiting}
+        found = {}
+        if owned:
+            batch = SharedTask(self._load_many(kind, owned, compute_many))
+            # Other callers wait on single keys of this batch
+            for key in owned:
+                self._inflight[key] = SharedTask(self._pick(batch, key))
+            waits = [batch.wait(), *(task.wait() for task in waiting.values())]
+            loaded, *others = await asyncio.gather(*waits)
+            found.update(loaded)
+        else:
+            others = await asyncio.gather(*(task.wait() for task in waiting.values()))
+        found.update(zip(waiting, others))
+        for i, key in enumerate(keys):
+            if key in found:
+                values[i] = found[key]
+        return values
+
+    @staticmethod
+    async def _pick(batch, key):
+        return (await batch.wait())[key]
+
+    async def _load_many(self, kind, pending, compute_many):
+        # pending: key -> (content, params); returns key -> value
+        try:
+            values = {}
+            if self.path:
+                try:
+                    values = await run_io(self._disk_get_many, list(pending))
+                except sqlite3.Error as e:
+                    log.warning("result cache read failed", extra={"error": str(e)})
+                for key, value in values.items():
+                    self._count(kind, "disk_hits")
+                    self._memory_set(key, value)
+
+            missing = [key for key in pending if key not in values]
+            if missing:
+                for _ in missing:
+                    self._count(kind, "misses")
+                computed = json.loads(json.dumps(await compute_many([pending[key] for key in missing])))
+                for key, value in zip(missing, computed):
+                    values[key] = value
+                    self._memory_set(key, value)
+                await self._disk_write({key: values[key] for key in missing})
+            return values
+        finally:
+            for key in pending:
+                self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        totals = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        for counts in self.stats_by_kind.values():
+            for outcome, count in counts.items():
+                totals[outcome] += count
+        lookups = sum(totals.values())
+        return {
+            "memory_entries": len(self._memory),
+            "disk_path": self.path or None,
+            **totals,
+            "hit_rate": round((totals["memory_hits"] + totals["disk_hits"]) / lookups, 3) if lookups else 0,
+            "by_kind": self.stats_by_kind,
+        }
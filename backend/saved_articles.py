@@ -0,0 +1,153 @@
+import argparse
+import asyncio
+import hashlib
+import os
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from article_store import normalize_url
+
+# ================== Saved Articles ==================
+# Saved articles live in their own collection, one document per (user, url),
+# instead of an ever-growing array embedded in the user document. Users are
+# looked up through a case-insensitive collation index on auth0Id rather than
+# an anchored $regex scan, a save is a single upsert on the unique
+# (auth0Id, urlHash) index, so saving twice updates in place, and listing is
+# keyset-paginated newest first.
+#
+# The store only needs a database handle, so it runs against a motor client
+# in the app, a local mongod, or mongomock_motor in tests (tests/test_saved_articles.py).
+#
+#   MONGODB_DB                   database name
+#   SAVED_ARTICLES_COLLECTION    collection for saved articles
+#   SAVED_ARTICLES_PAGE_SIZE     default page size for listing
+#
+# Articles saved before this change are still embedded in users; move them:
+#   python saved_articles.py migrate
+
+MONGODB_DB = os.getenv('MONGODB_DB', 'test')
+SAVED_ARTICLES_COLLECTION = os.getenv('SAVED_ARTICLES_COLLECTION', 'savedarticles')
+SAVED_ARTICLES_PAGE_SIZE = int(os.getenv('SAVED_ARTICLES_PAGE_SIZE', 20))
+SAVED_ARTICLES_MAX_PAGE_SIZE = 100
+
+CASE_INSENSITIVE = {"locale": "en", "strength": 2}
+
+
+def url_hash(url: str) -> str:
+    return hashlib.sha256(normalize_url(url).encode()).hexdigest()
+
+
+def bson_now() -> datetime:
+    # What MongoDB will hand back: UTC, millisecond precision
+    now = datetime.now(timezone.utc)
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+
+def iso_utc(value):
+    if value is None:
+        return None
+    # Documents read back from MongoDB carry naive UTC datetimes
+    return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).isoformat()
+
+
+def article_helper(doc) -> dict:
+    return {
+        "id": str(doc["_id"]),
+        "title": doc.get("title", ""),
+        "url": doc.get("url", ""),
+        "content": doc.get("content", ""),
+        "savedAt": iso_utc(doc.get("savedAt")),
+    }
+
+
+class SavedArticleStore:
+    def __init__(self, db, collection=SAVED_ARTICLES_COLLECTION):
+        self.users = db["users"]
+        self.articles = db[collection]
+
+    async def ensure_indexes(self):
+        await self.users.create_index("auth0Id", name="auth0Id_case_insensitive", collation=CASE_INSENSITIVE)
+        await self.articles.create_index(
+            [("auth0Id", ASCENDING), ("urlHash", ASCENDING)], name="user_url_unique", unique=True,
+        )
+        await self.articles.create_index([("auth0Id", ASCENDING), ("_id", DESCENDING)], name="user_newest_first")
+
+    async def find_user_id(self, auth0Id):
+        # The stored spelling of the id, so every saved article uses one key per user
+        user = await self.users.find_one({"auth0Id": auth0Id}, {"auth0Id": 1}, collation=CASE_INSENSITIVE)
+        return user["auth0Id"] if user else None
+
+    async def save(self, user_id, article: dict):
+        url = article.get("url", "")
+        now = bson_now()
+        query = {"auth0Id": user_id, "urlHash": url_hash(url)}
+        fields = {"title": article.get("title", ""), "url": url, "content": article.get("content", ""), "updatedAt": now}
+        inserted = {"_id": ObjectId(), "savedAt": now}
+        update = {"$set": fields, "$setOnInsert": inserted}
+        try:
+            # The document as it was: None means this call inserted it
+            before = await self.articles.find_one_and_update(query, update, upsert=True, return_document=ReturnDocument.BEFORE)
+        except DuplicateKeyError:
+            # Two concurrent first saves raced on the upsert; the loser's retry updates
+            before = await self.articles.find_one_and_update(query, update, return_document=ReturnDocument.BEFORE)
+        doc = {**(before or {**query, **inserted}), **fields}
+        return article_helper(doc), before is None
+
+    async def list(self, user_id, limit=SAVED_ARTICLES_PAGE_SIZE, cursor=None):
+        # cursor is the id of the last article on the previous page
+        limit = max(1, min(limit, SAVED_ARTICLES_MAX_PAGE_SIZE))
+        query = {"auth0Id": user_id}
+        if cursor:
+            try:
+                query["_id"] = {"$lt": ObjectId(cursor)}
+            except InvalidId:
+                raise ValueError(f"Invalid cursor: {cursor}")
+        docs = await self.articles.find(query).sort("_id", DESCENDING).limit(limit + 1).to_list(length=limit + 1)
+        page = [article_helper(doc) for doc in docs[:limit]]
+        return page, (page[-1]["id"] if len(docs) > limit else None)
+
+    async def migrate_embedded(self):
+        # Moves savedArticles arrays out of user documents; safe to rerun
+        moved = 0
+        async for user in self.users.find({"savedArticles.0": {"$exists": True}}, {"auth0Id": 1, "savedArticles": 1}):
+            kept = []
+            for article in user["savedArticles"]:
+                if isinstance(article, dict) and article.get("url"):
+                    await self.save(user["auth0Id"], article)
+                    moved += 1
+                else:
+                    # Nothing to dedupe on; leave it where it is
+                    kept.append(article)
+            update = {"$set": {"savedArticles": kept}} if kept else {"$unset": {"savedArticles": ""}}
+            await self.users.update_one({"_id": user["_id"]}, update)
+        return moved
+
+
+def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Maintain the saved-articles collection.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("indexes", help="Create the collection and user indexes")
+    subparsers.add_parser("migrate", help="Move embedded savedArticles arrays into the collection")
+    args = parser.parse_args()
+
+    load_dotenv()
+
+    async def run():
+        client = AsyncIOMotorClient(os.getenv('MONGODB_URI'), tls=True, tlsAllowInvalidCertificates=True)
+        store = SavedArticleStore(client[MONGODB_DB])
+        await store.ensure_indexes()
+        if args.command == "migrate":
+            print(f"Moved {await store.migrate_embedded()} saved articles")
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
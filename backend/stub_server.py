@@ -0,0 +1,177 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+from io import BytesIO
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
+from PIL import Image, ImageDraw
+
+# ================== Offline Stub Server ==================
+# Stands in for everything the app reaches over the network, so benchmarks
+# run without news sites, NewsAPI or OpenAI:
+#
+#   GET  /articles/<slug>          fixture HTML from fixtures/articles/
+#   GET  /images/<name>.jpg        deterministic generated photos
+#   GET  /v2/everything            NewsAPI search
+#   GET  /v2/top-headlines         NewsAPI headlines
+#   POST /v1/chat/completions      OpenAI chat, plain or streamed
+#
+# Point the app at it with NEWSAPI_BASE_URL=http://host:port and
+# OPENAI_API_BASE=http://host:port/v1. Latencies are simulated:
+#
+#   STUB_ARTICLE_LATENCY_MS, STUB_NEWSAPI_LATENCY_MS, STUB_LLM_LATENCY_MS
+#
+#   python stub_server.py --port 8900
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures', 'articles')
+STUB_ARTICLE_LATENCY_MS = float(os.getenv('STUB_ARTICLE_LATENCY_MS', 50))
+STUB_NEWSAPI_LATENCY_MS = float(os.getenv('STUB_NEWSAPI_LATENCY_MS', 100))
+STUB_LLM_LATENCY_MS = float(os.getenv('STUB_LLM_LATENCY_MS', 400))
+
+app = FastAPI()
+_images = {}
+
+
+def fixture_slugs():
+    return sorted(name[:-5] for name in os.listdir(FIXTURE_DIR) if name.endswith('.html'))
+
+
+def generate_image(name: str) -> bytes:
+    # A seeded "photo": gradient background and a few shapes, sized per name
+    rng = random.Random(hashlib.sha256(name.encode()).digest())
+    width, height = rng.choice([(800, 600), (640, 480), (1024, 683)])
+    img = Image.new("RGB", (width, height))
+    draw = ImageDraw.Draw(img)
+    top, bottom = [tuple(rng.randrange(256) for _ in range(3)) for _ in range(2)]
+    for y in range(height):
+        t = y / height
+        draw.line([(0, y), (width, y)], fill=tuple(int(a + (b - a) * t) for a, b in zip(top, bottom)))
+    for _ in range(12):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        x1, y1 = x0 + rng.randrange(20, width // 3), y0 + rng.randrange(20, height // 3)
+        draw.ellipse([x0, y0, x1, y1], fill=tuple(rng.randrange(256) for _ in range(3)))
+    out = BytesIO()
+    img.save(out, format="JPEG", quality=85)
+    return out.getvalue()
+
+
+async def simulate(latency_ms):
+    if latency_ms:
+        await asyncio.sleep(latency_ms / 1000)
+
+
+@app.get("/articles/{slug}")
+async def article(slug: str):
+    path = os.path.join(FIXTURE_DIR, f"{os.path.basename(slug)}.html")
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="No such fixture")
+    await simulate(STUB_ARTICLE_LATENCY_MS)
+    with open(path, encoding='utf-8') as f:
+        return HTMLResponse(f.read())
+
+
+@app.get("/images/{name}.jpg")
+async def image(name: str):
+    if name not in _images:
+        _images[name] = generate_image(name)
+    return Response(_images[name], media_type="image/jpeg")
+
+
+def newsapi_articles(request: Request, count):
+    base = str(request.base_url).rstrip('/')
+    slugs = fixture_slugs()
+    return [
+        {
+            "source": {"id": None, "name": "Fixture News"},
+            "title": slug.replace('-', ' ').title(),
+            "url": f"{base}/articles/{slug}",
+            "publishedAt": "2024-09-21T08:00:00Z",
+        }
+        for slug in slugs[:count]
+    ]
+
+
+@app.get("/v2/everything")
+async def everything(request: Request, pageSize: int = 2):
+    await simulate(STUB_NEWSAPI_LATENCY_MS)
+    articles = newsapi_articles(request, pageSize)
+    return {"status": "ok", "totalResults": len(articles), "articles": articles}
+
+
+@app.get("/v2/top-headlines")
+async def top_headlines(request: Request, pageSize: int = 2):
+    await simulate(STUB_NEWSAPI_LATENCY_MS)
+    articles = newsapi_articles(request, pageSize)
+    return {"status": "ok", "totalResults": len(articles), "articles": articles}
+
+
+def chat_answer(messages):
+    prompt = messages[-1]["content"]
+    if prompt.startswith("Generate up to"):
+        return "\n".join([
+            "What is the main event described in the article?",
+            "Who is affected by it?",
+            "What happens next?",
+        ])
+    if prompt.startswith("Analyze the bias"):
+        return "The article quotes supporters and critics and mostly reports facts; it shows little overt bias."
+    return "Based on the article, the answer is described in its opening paragraphs."
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    answer = chat_answer(body.get("messages", []))
+    completion_id = f"chatcmpl-stub-{hashlib.sha256(answer.encode()).hexdigest()[:12]}"
+    created = int(time.time())
+    model = body.get("model", "gpt-4")
+
+    if not body.get("stream"):
+        await simulate(STUB_LLM_LATENCY_MS)
+        return JSONResponse({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        })
+
+    words = answer.split(" ")
+
+    async def events():
+        for i, word in enumerate(words):
+            await simulate(STUB_LLM_LATENCY_MS / len(words))
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word}, "finish_reason": None}],
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+        done = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        yield f"data: {json.dumps(done)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve fixture articles and stub NewsAPI/OpenAI endpoints.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
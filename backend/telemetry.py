@@ -0,0 +1,212 @@
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# ================== Telemetry ==================
+# Every pipeline stage (fetch, parse, clean, tokenize, inference, generate,
+# external_api, db) is timed into one Prometheus histogram labelled by stage
+# and target (model, route or host), next to token counts, batch sizes, cache
+# outcomes, model memory and admission queue depths. /metrics serves them; under gunicorn set
+# PROMETHEUS_MULTIPROC_DIR so every worker's numbers are aggregated.
+#
+# The stages of the current request are also collected per request and sent
+# back in a Server-Timing header when the client asks with "X-Timing: 1" (or
+# always, with TIMING_HEADER=always), and logged with the request.
+#
+#   LOG_FORMAT       json | text
+#   LOG_LEVEL        logging level name
+#   TIMING_HEADER    "always" to send Server-Timing on every response
+
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+TIMING_HEADER = os.getenv('TIMING_HEADER', '')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+
+STAGE_SECONDS = Histogram(
+    "newslyzer_stage_seconds", "Time spent in one pipeline stage",
+    ["stage", "target"], buckets=LATENCY_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    "newslyzer_request_seconds", "End-to-end request latency",
+    ["route", "method", "status"], buckets=LATENCY_BUCKETS,
+)
+TOKENS = Histogram(
+    "newslyzer_tokens", "Tokens fed to a model per call",
+    ["stage", "target"], buckets=(16, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384),
+)
+BATCH_SIZE = Histogram(
+    "newslyzer_batch_size", "Items per micro-batched forward pass",
+    ["batcher"], buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+CACHE_EVENTS = Counter(
+    "newslyzer_cache_events_total", "Cache lookups by outcome",
+    ["cache", "outcome"],
+)
+MODEL_MEMORY = Gauge(
+    "newslyzer_model_memory_bytes", "Estimated memory of a loaded model",
+    ["model"], multiprocess_mode="liveall",
+)
+QUEUE_DEPTH = Gauge(
+    "newslyzer_queue_depth", "Requests admitted to a route, or calls waiting for a model",
+    ["queue"], multiprocess_mode="livesum",
+)
+ADMISSION_EVENTS = Counter(
+    "newslyzer_admission_events_total", "Admission decisions by outcome",
+    ["queue", "outcome"],
+)
+
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def stage(name, target="", observe=True):
+    # Works around awaits too: `with stage("fetch", "article"): await ...`
+    # observe=False only adds it to the current request's breakdown, for a
+    # caller's share of work the histogram already counts elsewhere
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        if observe:
+            STAGE_SECONDS.labels(name, target).observe(elapsed)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((name, target, elapsed))
+
+
+def observe_tokens(stage_name, target, count):
+    TOKENS.labels(stage_name, target).observe(count)
+
+
+def observe_batch(batcher, size):
+    BATCH_SIZE.labels(batcher).observe(size)
+
+
+def count_cache(cache, outcome, amount=1):
+    CACHE_EVENTS.labels(cache, outcome).inc(amount)
+
+
+def set_model_memory(model, size_bytes):
+    MODEL_MEMORY.labels(model).set(size_bytes)
+
+
+def set_queue_depth(queue, depth):
+    QUEUE_DEPTH.labels(queue).set(depth)
+
+
+def count_admission(queue, outcome):
+    ADMISSION_EVENTS.labels(queue, outcome).inc()
+
+
+# ---- per-request breakdown ----
+
+def start_request() -> list:
+    # Tasks spawned for this request copy the context, so they append to the same list
+    timings = []
+    _request_timings.set(timings)
+    return timings
+
+
+def background_task(coro) -> asyncio.Task:
+    # Long-lived workers start from an empty context; a copy of the request
+    # that happened to start them would collect their stages forever
+    return contextvars.Context().run(asyncio.ensure_future, coro)
+
+
+class SharedTask:
+    # One task awaited by several requests (single-flight loads). Its stages
+    # go to a list of its own, copied into each caller's breakdown when the
+    # caller's wait ends, so coalesced callers see the stages too and no
+    # request collects another's
+    def __init__(self, coro):
+        self.timings = []
+        context = contextvars.copy_context()
+        context.run(_request_timings.set, self.timings)
+        self.task = context.run(asyncio.ensure_future, coro)
+
+    def done(self) -> bool:
+        return self.task.done()
+
+    async def wait(self):
+        # Shielded, so one caller going away doesn't cancel the shared work
+        try:
+            return await asyncio.shield(self.task)
+        finally:
+            timings = _request_timings.get()
+            if timings is not None:
+                timings.extend(self.timings)
+
+
+def summarize_timings(timings) -> dict:
+    totals = {}
+    for name, target, elapsed in timings:
+        key = f"{name}.{target}" if target else name
+        totals[key] = totals.get(key, 0) + elapsed
+    return {key: round(seconds * 1000, 1) for key, seconds in totals.items()}
+
+
+def server_timing(timings, total_seconds) -> str:
+    parts = [f'{key.replace(".", "_")};dur={ms}' for key, ms in summarize_timings(timings).items()]
+    parts.append(f"total;dur={round(total_seconds * 1000, 1)}")
+    return ", ".join(parts)
+
+
+def observe_request(route, method, status, seconds):
+    REQUEST_SECONDS.labels(route, method, str(status)).observe(seconds)
+
+
+def metrics_payload():
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+# ---- structured logs ----
+
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    # One JSON object per line; anything passed in `extra` becomes a field
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _RESERVED})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level=LOG_LEVEL, fmt=LOG_FORMAT):
+    handler = logging.StreamHandler()
+    if fmt == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
@@ -0,0 +1,28 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("prometheus_client")
+
+from article_store import ArticleStore, ParsedArticle
+
+
+def test_building_the_passage_index_counts_toward_the_byte_cap():
+    text = " ".join(f"Sentence number {i} about topic{i}." for i in range(2000))
+
+    async def fetch(url):
+        return ParsedArticle(url, "title", text, text)
+
+    async def run():
+        store = ArticleStore(fetch)
+        article = await store.get("https://example.com/a")
+        before = store.stats()["bytes"]
+        store.max_bytes = before * 2
+        await asyncio.get_running_loop().run_in_executor(None, article.passage_index)
+        await asyncio.sleep(0)
+        return before, store.stats()
+
+    before, stats = asyncio.run(run())
+    # The index outweighs the text, so the grown entry no longer fits
+    assert stats["entries"] == 0 and stats["bytes"] == 0
+    assert before > 0
@@ -0,0 +1,41 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("prometheus_client")
+
+from batching import MicroBatcher
+
+
+def test_group_that_does_not_fit_starts_the_next_batch():
+    seen = []
+
+    def batch_fn(items):
+        seen.append(len(items))
+        return items
+
+    async def run():
+        batcher = MicroBatcher("sentiment", batch_fn, max_batch_size=4, max_wait_ms=20)
+        return await asyncio.gather(batcher.submit_many([1, 2, 3]), batcher.submit_many([4, 5]))
+
+    assert asyncio.run(run()) == [[1, 2, 3], [4, 5]]
+    assert seen == [3, 2]
+
+
+def test_batches_run_concurrently_up_to_pool_width(monkeypatch):
+    monkeypatch.setenv("INFERENCE_WORKERS_FACT_OPINION", "2")
+
+    def batch_fn(items):
+        time.sleep(0.2)
+        return items
+
+    async def run():
+        batcher = MicroBatcher("fact_opinion", batch_fn, max_batch_size=2, max_wait_ms=1)
+        started = time.perf_counter()
+        await asyncio.gather(batcher.submit_many([1, 2]), batcher.submit_many([3, 4]))
+        return time.perf_counter() - started, batcher.batches
+
+    elapsed, batches = asyncio.run(run())
+    assert batches == 2
+    assert elapsed < 0.35
@@ -0,0 +1,38 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("prometheus_client")
+
+from admission import DeadlineExceeded
+from llm_gateway import LLMGateway
+
+MESSAGES = [{"role": "user", "content": "Analyze the bias in this article: text"}]
+
+
+def test_started_call_outlives_a_short_request_deadline():
+    async def run():
+        gateway = LLMGateway(backend="stub", timeout=5)
+        gateway.backend.latency = 0.2
+        return await gateway.chat("bias", MESSAGES, deadline=time.monotonic() + 0.05)
+
+    assert asyncio.run(run()).startswith("Stub response")
+
+
+def test_deadline_sheds_calls_still_waiting_for_a_slot():
+    async def run():
+        gateway = LLMGateway(backend="stub", concurrency=1, timeout=5)
+        gateway.backend.latency = 0.2
+        first = asyncio.ensure_future(gateway.chat("bias", MESSAGES))
+        await asyncio.sleep(0.01)
+        with pytest.raises(DeadlineExceeded):
+            await gateway.chat("bias", [{"role": "user", "content": "other"}], deadline=time.monotonic() + 0.05)
+        with pytest.raises(DeadlineExceeded):
+            await gateway.chat("bias", [{"role": "user", "content": "late"}], deadline=time.monotonic() - 1)
+        await first
+        return gateway.stats()
+
+    stats = asyncio.run(run())
+    assert stats["calls"] == 1 and stats["timeouts"] == 0 and stats["failures"] == 0
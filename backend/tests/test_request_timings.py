@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("prometheus_client")
+
+from batching import MicroBatcher
+from telemetry import SharedTask, stage, start_request
+
+
+def stages(timings):
+    return [(name, target) for name, target, _ in timings]
+
+
+def test_batched_requests_get_their_own_timings():
+    async def request(batcher, item):
+        timings = start_request()
+        assert await batcher.submit(item) == item * 2
+        return timings
+
+    async def run():
+        batcher = MicroBatcher("sentiment", lambda items: [item * 2 for item in items], max_wait_ms=1)
+        # Each request runs in its own task, so each has its own context
+        first = await asyncio.ensure_future(request(batcher, 1))
+        first_count = len(first)
+        second = await asyncio.ensure_future(request(batcher, 2))
+        third = await asyncio.ensure_future(request(batcher, 3))
+        return first, first_count, second, third
+
+    first, first_count, second, third = asyncio.run(run())
+    assert stages(first) == [("inference", "sentiment")]
+    # The worker started by the first request no longer appends to it
+    assert len(first) == first_count
+    assert stages(second) == [("inference", "sentiment")]
+    assert stages(third) == [("inference", "sentiment")]
+
+
+def test_shared_task_stages_reach_every_caller():
+    async def load():
+        with stage("fetch", "article"):
+            await asyncio.sleep(0.01)
+        return "article"
+
+    async def request(shared):
+        timings = start_request()
+        assert await shared.wait() == "article"
+        return timings
+
+    async def run():
+        shared = SharedTask(load())
+        return await asyncio.gather(asyncio.ensure_future(request(shared)), asyncio.ensure_future(request(shared)))
+
+    first, second = asyncio.run(run())
+    assert stages(first) == stages(second) == [("fetch", "article")]
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("prometheus_client")
+
+from result_cache import ResultCache
+
+
+def test_concurrent_batched_lookups_compute_each_key_once():
+    computed = []
+
+    async def compute_many(items):
+        computed.extend(content for content, _ in items)
+        await asyncio.sleep(0.01)
+        return [content.upper() for content, _ in items]
+
+    async def compute_one():
+        computed.append("single")
+        return "never"
+
+    async def run():
+        cache = ResultCache(path="")
+        return await asyncio.gather(
+            cache.get_many_or_compute("answer", [("a", {}), ("b", {})], "model", compute_many),
+            cache.get_many_or_compute("answer", [("b", {}), ("c", {}), ("c", {})], "model", compute_many),
+            cache.get_or_compute("answer", "a", "model", {}, compute_one),
+        )
+
+    assert asyncio.run(run()) == [["A", "B"], ["B", "C", "C"], "A"]
+    assert sorted(computed) == ["a", "b", "c"]
+
+
+def test_disk_tier_is_pruned_by_age_and_row_count(tmp_path):
+    path = str(tmp_path / "results.sqlite3")
+    old = ResultCache(path=path)
+    old._disk_set_many({"stale": 1, "fresh": 2})
+    old._connection().execute("UPDATE results SET created_at = 0 WHERE key = 'stale'")
+    old._connection().commit()
+
+    async def run():
+        # A new process prunes on its first write
+        cache = ResultCache(path=path, disk_max_entries=3)
+        for i in range(4):
+            await cache.put("answer", f"text {i}", "model", {}, i)
+        return cache
+
+    cache = asyncio.run(run())
+    keys = {key for key, in cache._connection().execute("SELECT key FROM results")}
+    assert "stale" not in keys and "fresh" in keys
+    assert cache.prune() == 2
+    assert cache._connection().execute("SELECT COUNT(*) FROM results").fetchone()[0] == 3
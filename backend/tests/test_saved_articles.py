@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from saved_articles import SavedArticleStore
+
+
+def article(url, title="Title"):
+    return {"title": title, "url": url, "content": "Body"}
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_save_reports_created_then_updates_in_place():
+    async def scenario():
+        store = SavedArticleStore(mongomock_motor.AsyncMongoMockClient()["test"])
+        first, created = await store.save("user-1", article("https://example.com/a?utm_source=x"))
+        second, created_again = await store.save("user-1", article("https://example.com/a", title="Retitled"))
+        count = await store.articles.count_documents({"auth0Id": "user-1"})
+        return first, created, second, created_again, count
+
+    first, created, second, created_again, count = run(scenario())
+    assert created and not created_again
+    assert count == 1
+    assert second["id"] == first["id"]
+    assert second["title"] == "Retitled"
+    assert second["savedAt"] == first["savedAt"]
+
+
+def test_list_pages_newest_first_by_cursor():
+    async def scenario():
+        store = SavedArticleStore(mongomock_motor.AsyncMongoMockClient()["test"])
+        for i in range(5):
+            await store.save("user-1", article(f"https://example.com/{i}", title=str(i)))
+        await store.save("user-2", article("https://example.com/other"))
+        first, cursor = await store.list("user-1", limit=2)
+        second, cursor = await store.list("user-1", limit=2, cursor=cursor)
+        third, cursor = await store.list("user-1", limit=2, cursor=cursor)
+        return [a["title"] for a in first + second + third], cursor
+
+    titles, cursor = run(scenario())
+    assert titles == ["4", "3", "2", "1", "0"]
+    assert cursor is None
+
+
+def test_list_rejects_a_bad_cursor():
+    store = SavedArticleStore(mongomock_motor.AsyncMongoMockClient()["test"])
+    with pytest.raises(ValueError):
+        run(store.list("user-1", cursor="not-an-id"))
+
+
+def test_migrate_embedded_is_idempotent():
+    async def scenario():
+        db = mongomock_motor.AsyncMongoMockClient()["test"]
+        await db["users"].insert_one({
+            "auth0Id": "user-1",
+            "savedArticles": [article("https://example.com/a"), article("https://example.com/a"), "legacy"],
+        })
+        store = SavedArticleStore(db)
+        moved = await store.migrate_embedded()
+        moved_again = await store.migrate_embedded()
+        user = await db["users"].find_one({"auth0Id": "user-1"})
+        count = await store.articles.count_documents({"auth0Id": "user-1"})
+        return moved, moved_again, user, count
+
+    moved, moved_again, user, count = run(scenario())
+    assert moved == 2
+    assert moved_again == 0
+    assert count == 1
+    assert user["savedArticles"] == ["legacy"]
@@ -0,0 +1,16 @@
+// models/SavedArticle.js
+import mongoose from 'mongoose';
+
+// Written by the API (one document per user and URL); read-only here
+const SavedArticleSchema = new mongoose.Schema({
+  auth0Id: { type: String, required: true },
+  urlHash: { type: String, required: true },
+  title: { type: String, required: true },
+  url: { type: String, required: true },
+  content: { type: String, required: true },
+  savedAt: { type: Date, default: Date.now },
+  updatedAt: { type: Date, default: Date.now },
+});
+
+export default mongoose.models.SavedArticle ||
+  mongoose.model('SavedArticle', SavedArticleSchema);
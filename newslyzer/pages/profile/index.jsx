@@ -2,6 +2,7 @@ import { withPageAuthRequired, getSession } from '@auth0/nextjs-auth0';
 import React, { useState, useEffect, useRef } from 'react';
 import dbConnect from '@/lib/mongodb';
 import User from '@/models/User';
+import SavedArticle from '@/models/SavedArticle';
 import { Space_Grotesk } from 'next/font/google';
 import Button from '@/components/shared/button';
 import Link from 'next/link';
@@ -44,6 +45,22 @@ export const getServerSideProps = withPageAuthRequired({
       existingUser.createdAt = existingUser.createdAt.toISOString();
     }
 
+    // Saved articles have their own collection; newest first, then any
+    // still embedded in the user document from before the move
+    const savedArticles = await SavedArticle.find({ auth0Id: existingUser.auth0Id })
+      .sort({ _id: -1 })
+      .limit(60)
+      .lean();
+    existingUser.savedArticles = [
+      ...savedArticles.map((article) => ({
+        id: article._id.toString(),
+        title: article.title,
+        url: article.url,
+        content: article.content,
+      })),
+      ...(existingUser.savedArticles || []),
+    ];
+
     // Pass the user profile data to the page component
     return { props: { user: existingUser } };
   },
@@ -108,7 +125,7 @@ export default function Profile({ user }) {
                   {article.title}
                 </h1>
                 <p className="text-justify">
-                  {article.content.substring(0, 300)}...
+                  {(article.content || '').substring(0, 300)}...
                 </p>
                 <Link href={article.url}>
                   <Button className="bg-primary-bg mt-2" text="Read More" />